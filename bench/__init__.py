@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""
+Performance benchmarks of YaPlayer against the local fake Yandex Music backend.
+Run from the project root: `python -m bench.run --help`.
+"""
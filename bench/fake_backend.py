@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in of the Yandex Music API for the benchmarks.
+"""
+import json
+import re
+from hashlib import md5
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import sleep
+from urllib.parse import parse_qs, urlsplit
+from yandex_music import Client
+
+from transport import PooledRequest
+
+UID = 1
+# 1x1 transparent PNG
+COVER = bytes.fromhex('89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+                      '1f15c4890000000d49444154789c6360000002000185d38c3d0000000049454e44ae426082')
+
+
+class FakeLibrary:
+    """
+    Deterministic music library: the tracks are numbered from 1, the playlist of kind N has N tracks
+    and the likes collection has `likes` tracks.
+    """
+    __slots__ = ('kinds', 'likes', 'track_kb', 'similar', 'host')
+
+    def __init__(self, kinds: list[int], likes: int, track_kb: int=512, similar: int=50) -> None:
+        self.kinds = kinds
+        self.likes = likes
+        self.track_kb = track_kb
+        self.similar = similar
+        self.host = ''
+
+    def track(self, track_id: int) -> dict:
+        """
+        Get the track object.
+        :param track_id:
+        :return:
+        """
+        return {'id': str(track_id), 'realId': str(track_id), 'title': f'Трек {track_id}', 'available': True,
+                'durationMs': 180000 + track_id % 120000, 'ogImage': f'{self.host}/covers/{track_id}/%%',
+                'coverUri': f'{self.host}/covers/{track_id}/%%',
+                'artists': [{'id': track_id % 997, 'name': f'Исполнитель {track_id % 997}'}],
+                'albums': [{'id': track_id % 4999, 'title': f'Альбом {track_id % 4999}',
+                            'year': 2000 + track_id % 24}]}
+
+    def playlist(self, kind: int, tracks: bool=True) -> dict:
+        """
+        Get the playlist object.
+        :param kind:
+        :param tracks: Include the tracks of the playlist.
+        :return:
+        """
+        playlist = {'owner': {'uid': UID, 'login': 'bench'}, 'uid': UID, 'kind': kind, 'title': f'Плейлист {kind}',
+                    'revision': 1, 'trackCount': kind, 'playlistUuid': f'bench-{kind}'}
+        if tracks:
+            playlist['tracks'] = [{'id': _id, 'track': self.track(_id), 'timestamp': '2024-01-01T00:00:00+00:00'}
+                                  for _id in range(1, kind + 1)]
+
+        return playlist
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Routes the API requests to the library, every response is delayed by the latency
+    and its body is sent at the bandwidth of the server.
+    """
+    server: 'FakeBackend'
+    protocol_version = 'HTTP/1.1'
+    # The headers and the body are written separately, Nagle's delay would add to the latency of keep-alive requests
+    disable_nagle_algorithm = True
+
+    ROUTES = (('GET', re.compile(r'/account/status'), 'status'),
+              ('GET', re.compile(r'/users/\d+/playlists/list'), 'playlists'),
+              ('GET', re.compile(r'/users/\d+/playlists/(\d+)'), 'playlist'),
+              ('GET', re.compile(r'/users/\d+/likes/tracks'), 'likes'),
+              ('POST', re.compile(r'/tracks'), 'tracks'),
+              ('GET', re.compile(r'/tracks/(\d+)(?::\d+)?/similar'), 'similar'),
+              ('GET', re.compile(r'/tracks/(\d+)(?::\d+)?/download-info'), 'download_info'),
+              ('GET', re.compile(r'/download-info/(\d+)'), 'download_xml'),
+              ('GET', re.compile(r'/get-mp3/\w+/\w+/track/(\d+)'), 'track_file'),
+              ('GET', re.compile(r'/covers/(\d+)/[\dx]+'), 'cover'))
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """
+        Handle GET request.
+        :return:
+        """
+        self._route('GET')
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        """
+        Handle POST request.
+        :return:
+        """
+        self._route('POST')
+
+    def log_message(self, *_) -> None:  # pylint: disable=arguments-differ
+        """
+        Keep the benchmark output clean.
+        :return:
+        """
+
+    def _route(self, method: str) -> None:
+        self.server.requests += 1
+        path = urlsplit(self.path).path
+        for _method, pattern, name in _Handler.ROUTES:
+            match = pattern.fullmatch(path)
+            if _method == method and match:
+                sleep(self.server.latency)
+                getattr(self, f'_{name}')(*match.groups())
+                return
+
+        self._send(404, json.dumps({'error': 'not-found', 'message': path}).encode(), 'application/json')
+
+    def _send(self, code: int, body: bytes, content_type: str, headers: dict[str, str]=None) -> None:
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        chunk = 64 * 1024
+        for _i in range(0, len(body), chunk):
+            self.wfile.write(body[_i:_i + chunk])
+            if self.server.bandwidth:
+                sleep(min(chunk, len(body) - _i) / self.server.bandwidth)
+
+    def _result(self, result) -> None:
+        self._send(200, json.dumps({'invocationInfo': {}, 'result': result}).encode(), 'application/json')
+
+    def _status(self) -> None:
+        self._result({'account': {'now': '2024-01-01T00:00:00+00:00', 'serviceAvailable': True, 'uid': UID,
+                                  'login': 'bench', 'displayName': 'bench'},
+                      'permissions': {}, 'subscription': {}})
+
+    def _playlists(self) -> None:
+        self._result([self.server.library.playlist(_k, False) for _k in self.server.library.kinds])
+
+    def _playlist(self, kind: str) -> None:
+        self._result(self.server.library.playlist(int(kind)))
+
+    def _likes(self) -> None:
+        self._result({'library': {'uid': UID, 'revision': 1, 'playlistUuid': 'bench-likes',
+                                  'tracks': [{'id': str(_id), 'albumId': str(_id % 4999),
+                                              'timestamp': '2024-01-01T00:00:00+00:00'}
+                                             for _id in range(1, self.server.library.likes + 1)]}})
+
+    def _tracks(self) -> None:
+        form = parse_qs(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode())
+        ids = [int(_id.split(':')[0]) for _val in form.get('track-ids', []) for _id in _val.split(',')]
+        self._result([self.server.library.track(_id) for _id in ids])
+
+    def _similar(self, track_id: str) -> None:
+        start = int(track_id)
+        self._result({'track': self.server.library.track(start),
+                      'similarTracks': [self.server.library.track(start + _i)
+                                        for _i in range(1, self.server.library.similar + 1)]})
+
+    def _download_info(self, track_id: str) -> None:
+        self._result([{'codec': 'mp3', 'bitrateInKbps': 192, 'gain': False, 'preview': False, 'direct': False,
+                       'downloadInfoUrl': f'https://{self.server.library.host}/download-info/{track_id}'}])
+
+    def _download_xml(self, track_id: str) -> None:
+        path = f'/track/{track_id}'
+        salt = md5(path.encode()).hexdigest()
+        xml = f'<?xml version="1.0" encoding="utf-8"?><download-info><host>{self.server.library.host}</host>' \
+              f'<path>{path}</path><ts>0000</ts><region>0</region><s>{salt}</s></download-info>'
+        self._send(200, xml.encode(), 'text/xml')
+
+    def _track_file(self, track_id: str) -> None:
+        # Starts as MP3 with ID3 tag for the cache scrub
+        body = b'ID3' + int(track_id).to_bytes(4, 'big') * (self.server.library.track_kb * 256)
+        match = re.fullmatch(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        if match is None:
+            self._send(200, body, 'audio/mpeg')
+        elif int(match[1]) >= len(body):
+            self._send(416, b'', 'audio/mpeg', {'Content-Range': f'bytes */{len(body)}'})
+        else:
+            self._send(206, body[int(match[1]):], 'audio/mpeg',
+                       {'Content-Range': f'bytes {match[1]}-{len(body) - 1}/{len(body)}'})
+
+    def _cover(self, _: str) -> None:
+        self._send(200, COVER, 'image/png')
+
+
+class FakeBackend(ThreadingHTTPServer):
+    """
+    HTTP server emulating the endpoints `yandex_music.Client` uses, running in a daemon thread.
+    The absolute https links of the API (download info, tracks and covers) point to the server too.
+    """
+    daemon_threads = True
+
+    def __init__(self, library: FakeLibrary, latency_ms: float=0, bandwidth_kbps: float=0) -> None:
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.library = library
+        library.host = f'127.0.0.1:{self.server_port}'
+        self.latency = latency_ms / 1000
+        self.bandwidth = bandwidth_kbps * 1024
+        self.requests = 0
+        self._thread = Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """
+        Base URL of the API.
+        :return:
+        """
+        return f'http://{self.library.host}'
+
+    def __enter__(self) -> 'FakeBackend':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        super().__exit__(*args)
+
+    def client(self, token: str='bench') -> Client:
+        """
+        Create the client of the server.
+        :param token:
+        :return:
+        """
+        return Client(token, base_url=self.url, request=_LocalRequest())
+
+
+class _LocalRequest(PooledRequest):
+    """
+    Sends the https requests as plain http, the fake server has no TLS.
+    """
+    def _request_wrapper(self, method: str, url: str, **kwargs):
+        return super()._request_wrapper(method, url.replace('https://', 'http://', 1), **kwargs)
+
+    def download_file(self, url: str, fname: str, progress=None, variant: str=None) -> int:
+        return super().download_file(url.replace('https://', 'http://', 1), fname, progress, variant)
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite runner.
+    python -m bench.run [--sizes 100,1000,10000] [--latency-ms 20] [--bandwidth-kbps 4096] [--baseline old.json]
+The results are written to `bench/results/<time>.json`, with `--baseline` the medians are compared to an older run.
+"""
+import json
+import os
+import platform
+import sys
+import tempfile
+from argparse import ArgumentParser, Namespace
+from contextlib import redirect_stdout
+from datetime import datetime
+from statistics import mean, median
+from time import perf_counter
+from typing import Callable
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+# pylint: disable=wrong-import-position
+from bench.fake_backend import FakeBackend, FakeLibrary
+from yaclient import YaClient
+
+RESULTS_DIR = f'{os.path.dirname(os.path.abspath(__file__))}/results'
+
+
+class Suite:
+    """
+    Runs the benchmarks against the fake backend and collects the timings.
+    Every case is run `repeat` times, the setup of the case is not timed.
+    """
+    __slots__ = ('args', 'server', 'tmp_dir', 'results', 'skipped', 'app')
+
+    def __init__(self, args: Namespace, server: FakeBackend, tmp_dir: str) -> None:
+        self.args = args
+        self.server = server
+        self.tmp_dir = tmp_dir
+        self.results: dict[str, dict] = {}
+        self.skipped: dict[str, str] = {}
+        self.app = None
+
+    def client(self) -> YaClient:
+        """
+        Create the connected client with the empty cache.
+        :return:
+        """
+        YaClient.CACHE_DIR = tempfile.mkdtemp(dir=self.tmp_dir)
+        yac = YaClient('bench')
+        yac.clt = self.server.client()
+        yac.connect()
+        return yac
+
+    def measure(self, name: str, size: int, case: Callable[[], object], setup: Callable[[], object]=None) -> None:
+        """
+        Time the case and keep the result.
+        :param name:
+        :param size: Number of tracks of the case.
+        :param case:
+        :param setup: Called before every run.
+        :return:
+        """
+        runs = []
+        requests = self.server.requests
+        for _ in range(self.args.repeat):
+            if setup is not None:
+                setup()
+            start = perf_counter()
+            with redirect_stdout(None):
+                case()
+            runs.append((perf_counter() - start) * 1000)
+
+        key = f'{name}[{size}]'
+        self.results[key] = {'name': name, 'size': size, 'runs_ms': [round(_r, 3) for _r in runs],
+                             'min_ms': round(min(runs), 3), 'median_ms': round(median(runs), 3),
+                             'mean_ms': round(mean(runs), 3),
+                             'requests': (self.server.requests - requests) // self.args.repeat}
+        print(f'{key:<36}{self.results[key]["median_ms"]:>12.2f} ms')
+
+    def run(self) -> None:
+        """
+        Run all benchmarks.
+        :return:
+        """
+        self.bench_client()
+        try:
+            # pylint: disable=import-outside-toplevel
+            from PyQt5.QtWidgets import QApplication
+            from PyQt5.QtMultimedia import QMediaPlaylist  # pylint: disable=unused-import
+        except ImportError as e:
+            for name in ('TracksModel.set_tracks', 'PlaylistsModel.update_data', '_update_media'):
+                self.skipped[name] = f'Qt is not available: {e}'
+            return
+
+        self.app = QApplication.instance() or QApplication(sys.argv[:1])
+        self.bench_models()
+        self.bench_update_media()
+
+    def bench_client(self) -> None:
+        """
+        Network bound methods of the client.
+        :return:
+        """
+        yac = self.client()
+        for size in self.args.sizes:
+            self.measure('load_list', size, lambda s=size: yac.load_list('playlist', s))
+
+        self.measure('load_list_likes', self.args.likes, lambda: yac.load_list('likes'))
+        self.measure('load_similar', self.args.similar, lambda: yac.load_similar(1))
+
+        yac.load_list('playlist', min(self.args.sizes))
+        tracks = iter(yac.playlist * self.args.repeat)
+        track = None
+
+        def _next() -> None:
+            nonlocal track
+            track = next(tracks)
+            track.download_info = None
+            if yac.is_cached(track):
+                os.remove(yac.track_path(track))
+
+        self.measure('download_track', self.args.track_kb, lambda: yac.download_track(track), _next)
+
+    def bench_models(self) -> None:
+        """
+        Population of the list models.
+        :return:
+        """
+        # pylint: disable=import-outside-toplevel
+        from PyQt5.QtMultimedia import QMediaContent, QMediaPlaylist
+        from models.playlists import PlaylistsModel
+        from models.tracks import TracksModel
+
+        yac = self.client()
+        playlists = yac.fetch_playlists()
+        for size in self.args.sizes:
+            tracks = yac.fetch_playlist(size)[1]
+            media = [QMediaContent() for _ in tracks]
+            model = TracksModel(QMediaPlaylist(), 3)
+            self.measure('TracksModel.set_tracks', size, lambda m=model, t=tracks, md=media: m.set_tracks(t, md))
+
+            model = PlaylistsModel()
+            many = (playlists * (size // len(playlists) + 1))[:size]
+            self.measure('PlaylistsModel.update_data', size, lambda m=model, p=many: m.update_data(p))
+
+    def bench_update_media(self) -> None:
+        """
+        Media and rows update of the main window.
+        :return:
+        """
+        from gui import YaPlayerWindow  # pylint: disable=import-outside-toplevel
+
+        yac = self.client()
+        window = YaPlayerWindow()
+        # The window works with the client of the fake backend without the login
+        setattr(window, '_YaPlayerWindow__yac', yac)
+        for size in self.args.sizes:
+            tracks = yac.fetch_playlist(size)[1]
+            self.measure('_update_media', size,
+                         lambda t=tracks: window._update_media(window.model_tracks, t))  # pylint: disable=protected-access
+
+        window.deleteLater()
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict]) -> None:
+    """
+    Print the medians with the change against the baseline run.
+    :param results:
+    :param baseline:
+    :return:
+    """
+    print(f'\n{"case":<36}{"baseline":>12}{"current":>12}{"change":>10}')
+    for key, res in results.items():
+        old = baseline.get(key)
+        if old is None:
+            print(f'{key:<36}{"-":>12}{res["median_ms"]:>12.2f}{"-":>10}')
+        else:
+            change = (res['median_ms'] / old['median_ms'] - 1) * 100 if old['median_ms'] else 0
+            print(f'{key:<36}{old["median_ms"]:>12.2f}{res["median_ms"]:>12.2f}{change:>+9.1f}%')
+
+
+def parse_args(argv: list[str]=None) -> Namespace:
+    """
+    Parse the command line.
+    :param argv:
+    :return:
+    """
+    parser = ArgumentParser(prog='python -m bench.run', description='YaPlayer benchmarks with the fake backend')
+    parser.add_argument('--sizes', default='100,1000,10000', type=lambda s: [int(_s) for _s in s.split(',')],
+                        help='Track list sizes')
+    parser.add_argument('--likes', default=1000, type=int, help='Size of the likes collection')
+    parser.add_argument('--similar', default=50, type=int, help='Number of the similar tracks')
+    parser.add_argument('--track-kb', default=512, type=int, help='Size of the track file')
+    parser.add_argument('--latency-ms', default=20, type=float, help='Latency of every request')
+    parser.add_argument('--bandwidth-kbps', default=0, type=float, help='Bandwidth of the responses, 0 is unlimited')
+    parser.add_argument('--repeat', default=3, type=int, help='Runs of every case')
+    parser.add_argument('--out', default=None, help='Results file')
+    parser.add_argument('--baseline', default=None, help='Results file of an older run to compare with')
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str]=None) -> None:
+    """
+    Run the suite and write the results.
+    :param argv:
+    :return:
+    """
+    args = parse_args(argv)
+    library = FakeLibrary(args.sizes, args.likes, args.track_kb, args.similar)
+    with FakeBackend(library, args.latency_ms, args.bandwidth_kbps) as server, \
+            tempfile.TemporaryDirectory(prefix='yaplayer-bench-') as tmp_dir:
+        suite = Suite(args, server, tmp_dir)
+        suite.run()
+
+    for name, reason in suite.skipped.items():
+        print(f'{name:<36}skipped: {reason}')
+
+    started = datetime.now()
+    out = args.out or f'{RESULTS_DIR}/{started:%Y%m%d-%H%M%S}.json'
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as fh:
+        json.dump({'meta': {'time': started.isoformat(timespec='seconds'), 'python': platform.python_version(),
+                            'platform': platform.platform(), 'qt_platform': os.environ['QT_QPA_PLATFORM'],
+                            'config': {_k: _v for _k, _v in vars(args).items() if _k not in ('out', 'baseline')}},
+                   'results': suite.results, 'skipped': suite.skipped}, fh, indent=2)
+    print('Results:', out)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as fh:
+            compare(suite.results, json.load(fh)['results'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""
+Track and cover file cache with SQLite index and LRU eviction.
+"""
+import os
+import sqlite3
+from threading import Event, Lock, Thread
+from time import time
+
+PART = '.part'
+
+
+def part_path(path: str, variant: str=None) -> str:
+    """
+    Get the path of the incomplete download of the file.
+    :param path:
+    :param variant: Variant of the file content, e.g. the bitrate.
+    :return:
+    """
+    return f'{path}{PART}' if variant is None else f'{path}.{variant}{PART}'
+
+
+class TrackCache:  # pylint: disable=too-many-instance-attributes
+    """
+    Cache files are keyed by track id: `tracks/<id>.<codec>` and `covers/<id>.png`.
+    The index keeps size, codec/bitrate, last access time and play count of every file,
+    the least recently used files are removed in background when the cache exceeds the budget.
+    The downloads are written to `<file>.part` and renamed into place when they are complete,
+    `scrub` finds the damaged files left by the older versions or changed on disk.
+    """
+    __slots__ = ('root', 'tracks_dir', 'covers_dir', 'budget', 'pinned', 'total', '_db', '_lock', '_evict')
+
+    ROOT = f'{os.getcwd()}/.cache'
+    BUDGET_MB = 2048
+    PART_TTL = 7 * 24 * 3600
+
+    _SCHEMA = '''CREATE TABLE IF NOT EXISTS files (
+                     path TEXT PRIMARY KEY,
+                     track_id TEXT,
+                     codec TEXT,
+                     bitrate INTEGER,
+                     size INTEGER NOT NULL,
+                     accessed REAL NOT NULL,
+                     plays INTEGER NOT NULL DEFAULT 0,
+                     expected INTEGER);
+                 CREATE TABLE IF NOT EXISTS sync_queue (
+                     track_id TEXT PRIMARY KEY,
+                     list TEXT NOT NULL)'''
+
+    def __init__(self, root: str=ROOT, budget_mb: int=BUDGET_MB) -> None:
+        self.root = root
+        self.tracks_dir = f'{root}/tracks'
+        self.covers_dir = f'{root}/covers'
+        self.budget = budget_mb * 1024 * 1024
+        self.pinned: set[str] = set()
+        os.makedirs(self.tracks_dir, exist_ok=True)
+        os.makedirs(self.covers_dir, exist_ok=True)
+
+        self._db = sqlite3.connect(f'{root}/index.db', check_same_thread=False, isolation_level=None)
+        self._db.executescript(TrackCache._SCHEMA)
+        if 'expected' not in {row[1] for row in self._db.execute('PRAGMA table_info(files)')}:
+            self._db.execute('ALTER TABLE files ADD COLUMN expected INTEGER')
+        self._lock = Lock()
+        self._scan()
+        self.total: int = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM files').fetchone()[0]
+
+        self._evict = Event()
+        Thread(target=self._evict_loop, name='cache-evict', daemon=True).start()
+        if self.total > self.budget:
+            self._evict.set()
+
+    def track_path(self, track_id: int | str, codec: str='mp3') -> str:
+        """
+        Get the file path of the track.
+        :param track_id:
+        :param codec:
+        :return:
+        """
+        return f'{self.tracks_dir}/{track_id}.{codec}'
+
+    def cover_path(self, track_id: int | str, size: int=None) -> str:
+        """
+        Get the file path of the track cover or its thumbnail.
+        :param track_id:
+        :param size: Thumbnail size, the original cover if omitted.
+        :return:
+        """
+        return f'{self.covers_dir}/{track_id}.png' if size is None else f'{self.covers_dir}/{track_id}_{size}.png'
+
+    def add(self, path: str, track_id: int | str, codec: str=None, bitrate: int=None, expected: int=None) -> None:
+        """
+        Register the downloaded file at the index.
+        :param path:
+        :param track_id:
+        :param codec:
+        :param bitrate:
+        :param expected: File size reported by the server, checked by `scrub`.
+        :return:
+        """
+        size = os.path.getsize(path)
+        with self._lock:
+            row = self._db.execute('SELECT size FROM files WHERE path = ?', (path,)).fetchone()
+            self._db.execute('INSERT OR REPLACE INTO files (path, track_id, codec, bitrate, size, accessed, plays, '
+                             'expected) VALUES (?, ?, ?, ?, ?, ?, '
+                             'COALESCE((SELECT plays FROM files WHERE path = ?), 0), ?)',
+                             (path, str(track_id), codec, bitrate, size, time(), path, expected))
+            self.total += size - (row[0] if row else 0)
+
+        if self.total > self.budget:
+            self._evict.set()
+
+    def touch(self, path: str, play: bool=False) -> None:
+        """
+        Update the last access time of the file and optionally count the play.
+        :param path:
+        :param play:
+        :return:
+        """
+        with self._lock:
+            self._db.execute('UPDATE files SET accessed = ?, plays = plays + ? WHERE path = ?',
+                             (time(), int(play), path))
+
+    def quality(self, path: str) -> tuple[str, int] | None:
+        """
+        Get codec and bitrate of the cached file.
+        :param path:
+        :return:
+        """
+        with self._lock:
+            row = self._db.execute('SELECT codec, bitrate FROM files WHERE path = ?', (path,)).fetchone()
+
+        return row
+
+    def queue_add(self, name: str, track_ids: list[str]) -> None:
+        """
+        Add the tracks to the offline sync queue.
+        :param name: Track list name.
+        :param track_ids:
+        :return:
+        """
+        with self._lock:
+            self._db.executemany('INSERT OR IGNORE INTO sync_queue (track_id, list) VALUES (?, ?)',
+                                 ((_tid, name) for _tid in track_ids))
+
+    def queue_remove(self, track_id: str) -> None:
+        """
+        Remove the synced track from the queue.
+        :param track_id:
+        :return:
+        """
+        with self._lock:
+            self._db.execute('DELETE FROM sync_queue WHERE track_id = ?', (track_id,))
+
+    def queue_pending(self) -> list[str]:
+        """
+        Get the track ids left in the offline sync queue.
+        :return:
+        """
+        with self._lock:
+            return [row[0] for row in self._db.execute('SELECT track_id FROM sync_queue')]
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get the number of files, total size and budget.
+        :return:
+        """
+        with self._lock:
+            tracks, covers, plays = self._db.execute(
+                "SELECT COALESCE(SUM(path LIKE '%/tracks/%'), 0), COALESCE(SUM(path LIKE '%/covers/%'), 0), "
+                "COALESCE(SUM(plays), 0) FROM files").fetchone()
+
+        return {'tracks': tracks, 'covers': covers, 'plays': plays, 'size': self.total, 'budget': self.budget}
+
+    def describe(self) -> str:
+        """
+        Get the short cache stats description.
+        :return:
+        """
+        _st = self.stats()
+        return f'{_st["tracks"]} tracks, {_st["size"] >> 20}/{_st["budget"] >> 20} MB'
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used files until the cache fits the budget.
+        :return: Number of removed files.
+        """
+        removed = 0
+        with self._lock:
+            rows = self._db.execute('SELECT path, size FROM files ORDER BY accessed').fetchall()
+            for path, size in rows:
+                if self.total <= self.budget:
+                    break
+                if path in self.pinned:
+                    continue
+
+                self._remove(path, size)
+                removed += 1
+
+        return removed
+
+    def clear(self) -> None:
+        """
+        Remove all cached files.
+        :return:
+        """
+        with self._lock:
+            for path, size in self._db.execute('SELECT path, size FROM files').fetchall():
+                self._remove(path, size)
+
+            self._db.execute('DELETE FROM sync_queue')
+            self.total = 0
+
+    def upgradable(self, codec: str, bitrate: int, skip: set[str], limit: int) -> dict[str, tuple[str, tuple]]:
+        """
+        Get the track files of other codec or lower bitrate, the most played first.
+        :param codec: Preferred codec.
+        :param bitrate: Max bitrate.
+        :param skip: Track ids to skip.
+        :param limit:
+        :return: Path, codec and bitrate of the files by track id.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT track_id, path, codec, bitrate FROM files "
+                                    "WHERE path LIKE '%/tracks/%' AND track_id IS NOT NULL "
+                                    "AND (COALESCE(codec, '') != ? OR COALESCE(bitrate, 0) < ?) "
+                                    "ORDER BY plays DESC, accessed DESC", (codec, bitrate)).fetchall()
+
+        files = {}
+        for track_id, path, _codec, _bitrate in rows:
+            if len(files) >= limit:
+                break
+            if track_id not in skip and path not in self.pinned:
+                files[track_id] = (path, (_codec, _bitrate))
+
+        return files
+
+    def remove(self, path: str) -> None:
+        """
+        Remove the file from cache, e.g. replaced by the file of other codec.
+        :param path:
+        :return:
+        """
+        with self._lock:
+            row = self._db.execute('SELECT size FROM files WHERE path = ?', (path,)).fetchone()
+            if row is not None:
+                self._remove(path, row[0])
+
+    def scrub(self) -> list[str]:
+        """
+        Remove the damaged track files: the size differs from the expected or indexed one, or the file
+        doesn't start as an audio stream. The part files of the abandoned downloads are removed too.
+        Runs at the background thread, the files are checked without holding the index lock.
+        :return: Ids of the tracks of the removed files.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT path, track_id, size, expected FROM files "
+                                    "WHERE path LIKE '%/tracks/%'").fetchall()
+
+        # The parts were indexed as the complete files by the older versions
+        damaged = [(_path, _tid) for _path, _tid, size, expected in rows
+                   if _path.endswith(PART) or not TrackCache._is_intact(_path, expected or size)]
+        for path, _ in damaged:
+            self.remove(path)
+
+        for _dir in (self.tracks_dir, self.covers_dir):
+            with os.scandir(_dir) as it:
+                stale = [_e.path for _e in it
+                         if _e.name.endswith(PART) and _e.stat().st_mtime < time() - TrackCache.PART_TTL]
+            for path in stale:
+                os.remove(path)
+
+        return [_tid for _, _tid in damaged if _tid]
+
+    @staticmethod
+    def _is_intact(path: str, size: int) -> bool:
+        try:
+            with open(path, 'rb') as fh:
+                head = fh.read(8)
+                fh.seek(0, os.SEEK_END)
+                if fh.tell() != size:
+                    return False
+        except FileNotFoundError:
+            return True
+        except OSError:
+            return False
+
+        # ID3 tag, MPEG/ADTS frame sync or MP4 container
+        return head[:3] == b'ID3' or len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0 or \
+            head[4:8] == b'ftyp'
+
+    def _remove(self, path: str, size: int) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+        self._db.execute('DELETE FROM files WHERE path = ?', (path,))
+        self.total -= size
+
+    def _scan(self) -> None:
+        """
+        Reconcile the index with the files on disk.
+        :return:
+        """
+        known = {row[0] for row in self._db.execute('SELECT path FROM files')}
+        for path in known:
+            if not os.path.isfile(path):
+                self._db.execute('DELETE FROM files WHERE path = ?', (path,))
+
+        for _dir in (self.tracks_dir, self.covers_dir):
+            with os.scandir(_dir) as it:
+                for entry in it:
+                    if entry.is_file() and entry.path not in known and not entry.name.endswith(PART):
+                        _st = entry.stat()
+                        self._db.execute('INSERT INTO files (path, size, accessed) VALUES (?, ?, ?)',
+                                         (entry.path, _st.st_size, _st.st_mtime))
+
+    def _evict_loop(self) -> None:
+        while True:
+            self._evict.wait()
+            self._evict.clear()
+            removed = self.evict()
+            if removed:
+                print('Cache: evicted', removed, 'files')
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Headless YaPlayer: batch sync and cache warming without Qt, e.g. from cron.
+    python cli.py playlists
+    python cli.py sync likes 1003 1010
+    python cli.py similar 12345 --likes 10
+    python cli.py upgrade --limit 100
+    python cli.py stats
+The token and the cache budget are read from `settings.json` of the GUI, the cache is shared with the GUI,
+so the command must be run from the same directory.
+"""
+import json
+import os
+import sys
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+
+from cache import TrackCache
+from offline import OfflineSync
+from quality import QualityPolicy
+from transport import PooledRequest
+from yaclient import YaClient, Track
+
+CHUNK = 250
+PROGRESS_SEC = 5
+
+
+def load_settings() -> dict:
+    """
+    Read the GUI settings file.
+    :return:
+    """
+    if not os.path.exists('settings.json'):
+        return {}
+
+    with open('settings.json', 'r', encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def connect(args: Namespace, settings: dict) -> YaClient:
+    """
+    Create the connected client.
+    :param args:
+    :param settings:
+    :return:
+    """
+    token = args.token or os.environ.get('YA_TOKEN') or settings.get('TOKEN')
+    if not token:
+        sys.exit('You should get a token. See https://yandex-music.readthedocs.io/en/main/token.html')
+
+    yac = YaClient(token, settings.get('cache', {}).get('budget_mb', TrackCache.BUDGET_MB),
+                   PooledRequest.from_settings(settings.get('transport', {})),
+                   QualityPolicy.from_settings(settings.get('quality', {})))
+    if not yac.connect():
+        sys.exit('Invalid token')
+
+    return yac
+
+
+def fetch_likes(yac: YaClient, workers: int) -> list[Track]:
+    """
+    Fetch the likes collection by chunks in parallel and save its snapshot for the GUI.
+    :param yac:
+    :param workers:
+    :return:
+    """
+    res = yac.sync_likes()
+    if res is None:
+        # The collection is not changed since the saved snapshot
+        snapshot = yac.library.load_tracks('likes', yac.clt)
+        return [] if snapshot is None else snapshot[1]
+
+    revision, shorts = res
+    ids = [_ts.track_id for _ts in shorts]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='likes') as pool:
+        chunks = pool.map(yac.clt.tracks, [ids[_i:_i + CHUNK] for _i in range(0, len(ids), CHUNK)])
+        tracks = [_tr for chunk in chunks for _tr in chunk]
+
+    yac.library.save_tracks('likes', revision, tracks)
+    return tracks
+
+
+def download(yac: YaClient, lists: dict[str, list[Track]], workers: int) -> int:
+    """
+    Download the tracks and covers of the lists to the cache, the queue survives the interruption
+    and is resumed by the GUI or the next run.
+    :param yac:
+    :param lists: Tracks by list name.
+    :param workers:
+    :return: Number of failed downloads.
+    """
+    offline = OfflineSync(yac, workers)
+    resumed = offline.resume()
+    if resumed:
+        print(f'Resumed: {resumed} tracks')
+
+    # The resumed tracks of the lists are not queued again by the sync
+    for name, tracks in lists.items():
+        print(f'{name}: {len(tracks)} tracks')
+        offline.sync(name, tracks)
+
+    while offline.is_active():
+        sleep(PROGRESS_SEC)
+        print(offline.progress())
+
+    print(offline.progress())
+    offline.shutdown()
+    return offline.failed
+
+
+def cmd_playlists(yac: YaClient, _: Namespace) -> int:
+    """
+    Print the playlists of the user.
+    :param yac:
+    :param _:
+    :return:
+    """
+    for _pl in yac.fetch_playlists():
+        print(f'{_pl.kind:>8}  {_pl.track_count:>6}  rev {_pl.revision:<6} {_pl.title}')
+
+    return 0
+
+
+def cmd_sync(yac: YaClient, args: Namespace) -> int:
+    """
+    Sync the playlists and the likes to the cache.
+    :param yac:
+    :param args:
+    :return:
+    """
+    lists = {}
+    for name in args.lists:
+        if name == 'likes':
+            lists[name] = fetch_likes(yac, args.workers)
+        else:
+            lists[name] = yac.fetch_playlist(int(name) if name.isdigit() else name)[1]
+
+    return 1 if download(yac, lists, args.workers) else 0
+
+
+def cmd_similar(yac: YaClient, args: Namespace) -> int:
+    """
+    Pre-fetch the similar tracks radios of the seed tracks.
+    :param yac:
+    :param args:
+    :return:
+    """
+    seeds = list(args.tracks)
+    if args.likes:
+        res = yac.sync_likes()
+        if res is None:
+            snapshot = yac.library.load_tracks('likes', yac.clt)
+            seeds.extend(str(_tr.id) for _tr in (snapshot[1] if snapshot else [])[:args.likes])
+        else:
+            seeds.extend(_ts.track_id for _ts in res[1][:args.likes])
+
+    with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix='similar') as pool:
+        radios = pool.map(yac.fetch_similar, seeds)
+        lists = {f'similar {_seed}': _tracks[:args.depth] for _seed, _tracks in zip(seeds, radios)}
+
+    return 1 if download(yac, lists, args.workers) else 0
+
+
+def cmd_upgrade(yac: YaClient, args: Namespace) -> int:
+    """
+    Download again the cached tracks of lower quality than the policy allows.
+    :param yac:
+    :param args:
+    :return:
+    """
+    print(f'Upgraded: {yac.upgrade_cache(args.limit)} tracks')
+    return 0
+
+
+def cmd_stats(yac: YaClient, _: Namespace) -> int:
+    """
+    Print the cache stats.
+    :param yac:
+    :param _:
+    :return:
+    """
+    _st = yac.cache.stats()
+    print(f'Tracks:  {_st["tracks"]}')
+    print(f'Covers:  {_st["covers"]}')
+    print(f'Plays:   {_st["plays"]}')
+    print(f'Size:    {_st["size"] >> 20}/{_st["budget"] >> 20} MB')
+    print(f'Queue:   {len(yac.cache.queue_pending())}')
+    print(f'Library: {", ".join(map(str, yac.library.kinds())) or "-"}')
+    return 0
+
+
+def parse_args(argv: list[str]=None) -> Namespace:
+    """
+    Parse the command line.
+    :param argv:
+    :return:
+    """
+    parser = ArgumentParser(prog='python cli.py', description='Headless YaPlayer cache sync')
+    parser.add_argument('--token', help='Yandex Music token, TOKEN of settings.json by default')
+    parser.add_argument('--workers', type=int, default=OfflineSync.WORKERS, help='Parallel downloads')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('playlists', help='List the playlists').set_defaults(handler=cmd_playlists)
+    sync = commands.add_parser('sync', help='Download the playlists or likes to the cache')
+    sync.add_argument('lists', nargs='+', metavar='KIND|likes')
+    sync.set_defaults(handler=cmd_sync)
+    similar = commands.add_parser('similar', help='Pre-fetch the similar tracks radios')
+    similar.add_argument('tracks', nargs='*', metavar='TRACK_ID')
+    similar.add_argument('--likes', type=int, default=0, help='Use the first N liked tracks as seeds too')
+    similar.add_argument('--depth', type=int, default=20, help='Tracks of every radio')
+    similar.set_defaults(handler=cmd_similar)
+    upgrade = commands.add_parser('upgrade', help='Download the cached tracks of lower quality again')
+    upgrade.add_argument('--limit', type=int, default=100, help='Tracks to check')
+    upgrade.set_defaults(handler=cmd_upgrade)
+    commands.add_parser('stats', help='Print the cache stats').set_defaults(handler=cmd_stats)
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str]=None) -> int:
+    """
+    Run the command.
+    :param argv:
+    :return: Exit code.
+    """
+    args = parse_args(argv)
+    if args.command == 'stats':
+        # The cache stats need no connection
+        yac = YaClient(None, load_settings().get('cache', {}).get('budget_mb', TrackCache.BUDGET_MB))
+    else:
+        yac = connect(args, load_settings())
+
+    return args.handler(yac, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
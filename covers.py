@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Cover art: files and thumbnails on disk, decoded pixmaps in memory.
+"""
+import os
+from collections import OrderedDict
+from threading import get_ident
+from time import monotonic
+from PyQt5.QtCore import QObject, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap
+
+from workers import JobRunner
+from yaclient import YaClient
+
+
+class CoverStore(QObject):
+    """
+    Two-level cover cache. The covers are downloaded at `LARGE` size and downscaled thumbnails are kept
+    next to them, the files are decoded to QImage at the worker threads and the LRU of pixmaps
+    is kept at the GUI thread. `ready` is emitted when the requested cover is loaded.
+    The failed cover is not requested again for `RETRY_SEC`, so the repaints don't repeat the fetch offline.
+    """
+    ready = pyqtSignal(str, int)
+
+    LARGE = 200
+    SMALL = 48
+    CAPACITY = 512
+    WORKERS = 4
+    RETRY_SEC = 300
+
+    def __init__(self, yac: YaClient, parent: QObject=None, capacity: int=CAPACITY, workers: int=WORKERS) -> None:
+        super().__init__(parent)
+        self.yac = yac
+        self.capacity = capacity
+        self._pixmaps: OrderedDict[tuple[str, int], QPixmap] = OrderedDict()
+        # Monotonic time of the failed load by the cover key
+        self._failed: dict[tuple[str, int], float] = {}
+        self._jobs = JobRunner(self, workers)
+
+    def get(self, track_id: str, og_image: str | None, size: int) -> QPixmap | None:
+        """
+        Get the cover from memory, otherwise start loading it in background.
+        :param track_id:
+        :param og_image: Cover URL template of the track, the track has no cover if empty.
+        :param size: `LARGE` or `SMALL`.
+        :return: None if the cover is not loaded yet.
+        """
+        key = (track_id, size)
+        _px = self._pixmaps.get(key)
+        if _px is not None:
+            self._pixmaps.move_to_end(key)
+            return _px
+
+        failed = self._failed.get(key)
+        if not og_image or self._jobs.is_running(CoverStore._key(track_id, size)) or \
+                failed is not None and monotonic() - failed < CoverStore.RETRY_SEC:
+            return None
+
+        self._jobs.submit(CoverStore._key(track_id, size), '', self._load, track_id, og_image, size,
+                          on_done=lambda img, k=key: self._loaded(k, img),
+                          on_error=lambda e, k=key: self._load_failed(k, e))
+
+        return None
+
+    def cancel_except(self, track_ids: set[str], size: int) -> None:
+        """
+        Drop the queued loads of the covers which are not visible anymore.
+        :param track_ids:
+        :param size:
+        :return:
+        """
+        for key in [_k for _k in self._jobs.jobs if _k.endswith(f'/{size}') and _k[:_k.rindex('/')] not in track_ids]:
+            self._jobs.cancel(key)
+
+    def clear(self) -> None:
+        """
+        Drop the pixmaps and the queued loads.
+        :return:
+        """
+        self._jobs.cancel_all()
+        self._pixmaps.clear()
+        self._failed.clear()
+
+    @staticmethod
+    def _key(track_id: str, size: int) -> str:
+        return f'{track_id}/{size}'
+
+    def _load(self, track_id: str, og_image: str, size: int) -> QImage:
+        """
+        Get the cover file, download or downscale it if needed and decode it. Runs at the worker thread.
+        :param track_id:
+        :param og_image:
+        :param size:
+        :return:
+        """
+        _fname = self.yac.cache.cover_path(track_id, None if size == CoverStore.LARGE else size)
+        if os.path.isfile(_fname):
+            return QImage(_fname)
+
+        img = QImage(self.yac.fetch_cover(track_id, og_image, f'{CoverStore.LARGE}x{CoverStore.LARGE}'))
+        if size != CoverStore.LARGE and not img.isNull():
+            img = img.scaled(size, size, Qt.AspectRatioMode.KeepAspectRatio,
+                             Qt.TransformationMode.SmoothTransformation)
+            _part = f'{_fname}.{get_ident()}.part'
+            img.save(_part, 'PNG')
+            os.replace(_part, _fname)
+            self.yac.cache.add(_fname, track_id)
+
+        return img
+
+    def _loaded(self, key: tuple[str, int], img: QImage) -> None:
+        if img.isNull():
+            self._failed[key] = monotonic()
+            return
+
+        self._pixmaps[key] = QPixmap.fromImage(img)
+        while len(self._pixmaps) > self.capacity:
+            self._pixmaps.popitem(last=False)
+
+        self.ready.emit(*key)
+
+    def _load_failed(self, key: tuple[str, int], e: Exception) -> None:
+        print('Cover loading failed:', e)
+        self._failed[key] = monotonic()
@@ -2,42 +2,134 @@
 """
 QTableView button delegate.
 """
-from PyQt5.QtCore import QModelIndex, pyqtSignal
-from PyQt5.QtWidgets import QItemDelegate, QPushButton, QStyle, QStyleOptionViewItem, QWidget
+from PyQt5.QtCore import QAbstractItemModel, QAbstractProxyModel, QEvent, QModelIndex, QObject, \
+    QPersistentModelIndex, QSize, Qt, pyqtSignal
+from PyQt5.QtGui import QHelpEvent, QMouseEvent, QPainter
+from PyQt5.QtWidgets import QAbstractItemView, QItemDelegate, QStyle, QStyleOptionButton, QStyleOptionViewItem, \
+    QToolTip
 
 
 class ButtonDelegate(QItemDelegate):
     """
     QTableView button delegate for different roles.
+    The buttons of all rows are painted with the style, there are no widgets, the clicks come with `editorEvent`.
+    The `pressed` signal gets the row of the source model if the view is sorted or filtered with a proxy.
     """
     ICONS = {1: QStyle.SP_TrashIcon,
              2: QStyle.SP_FileDialogListView,
              3: QStyle.SP_DialogApplyButton}
+    ICON_SIZE = QSize(16, 16)
     pressed = pyqtSignal(int)
 
-    def __init__(self, parent: QWidget, tooltip: str) -> None:
+    def __init__(self, parent: QAbstractItemView, tooltip: str, icon: int) -> None:
         super().__init__(parent)
         self.tooltip = tooltip
+        self.icon = parent.style().standardIcon(ButtonDelegate.ICONS[icon])
         self.pnt_view = parent
+        self._hover = QPersistentModelIndex()
+        self._pressed = QPersistentModelIndex()
+        # The hover is tracked by the viewport, the delegate gets no events when the mouse leaves its column
+        parent.setMouseTracking(True)
+        parent.viewport().installEventFilter(self)
 
-    def createEditor(self, parent: QWidget, _, index: QModelIndex) -> QPushButton: # pylint: disable=invalid-name
+    def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex) -> None:
         """
-        Create the QPushButton instance.
-        :param parent:
+        Draw the button.
+        :param painter:
+        :param option:
         :param index:
         :return:
         """
-        bt = QPushButton(parent)
-        bt.setIcon(self.pnt_view.style().standardIcon(ButtonDelegate.ICONS[index.column()]))
-        bt.setToolTip(self.tooltip)
-        bt.clicked.connect(lambda checked, row=index.row(): self.pressed.emit(row))
-        return bt
+        opt = QStyleOptionButton()
+        opt.rect = option.rect.adjusted(1, 1, -1, -1)
+        opt.icon = self.icon
+        opt.iconSize = ButtonDelegate.ICON_SIZE
+        opt.state = QStyle.State_Enabled | (QStyle.State_Sunken if self._pressed == index else QStyle.State_Raised)
+        if self._hover == index:
+            opt.state |= QStyle.State_MouseOver
+        self.pnt_view.style().drawControl(QStyle.CE_PushButton, opt, painter, self.pnt_view)
 
-    def updateEditorGeometry(self, editor: QWidget, option: QStyleOptionViewItem, _: QModelIndex) -> None: # pylint: disable=invalid-name
+    def editorEvent(self, event: QEvent, _: QAbstractItemModel, __: QStyleOptionViewItem,  # pylint: disable=invalid-name
+                    index: QModelIndex) -> bool:
         """
-        Implementation for QPushButton redraw.
-        :param editor:
-        :param option:
+        Press the button with the left mouse button, the click is emitted on the release at the same button.
+        The events are consumed, so the click doesn't change the selection.
+        :param event:
+        :param index:
+        :return:
+        """
+        if event.type() in (QEvent.MouseButtonPress, QEvent.MouseButtonDblClick):
+            if event.button() == Qt.LeftButton:
+                self._set_pressed(QPersistentModelIndex(index))
+            return True
+
+        if event.type() == QEvent.MouseButtonRelease:
+            if self._pressed == index:
+                self._set_pressed(QPersistentModelIndex())
+                self.pressed.emit(self.source_row(index))
+            return True
+
+        return False
+
+    def helpEvent(self, event: QHelpEvent, view: QAbstractItemView, _: QStyleOptionViewItem,  # pylint: disable=invalid-name
+                  __: QModelIndex) -> bool:
+        """
+        Show the button tooltip.
+        :param event:
+        :param view:
+        :return:
+        """
+        QToolTip.showText(event.globalPos(), self.tooltip, view)
+        return True
+
+    def eventFilter(self, _: QObject, event: QEvent) -> bool:  # pylint: disable=invalid-name
+        """
+        Track the hovered button of the viewport and drop the press released out of the button.
+        :param event:
+        :return: False, the events go on to the view.
+        """
+        if event.type() == QEvent.MouseMove:
+            index = self._own(self.pnt_view.indexAt(event.pos()))
+            if self._hover != index:
+                self._update(self._hover)
+                self._hover = QPersistentModelIndex(index)
+                self._update(self._hover)
+        elif event.type() == QEvent.Leave:
+            self._update(self._hover)
+            self._hover = QPersistentModelIndex()
+        elif event.type() == QEvent.MouseButtonRelease and isinstance(event, QMouseEvent) and \
+                self._pressed != self.pnt_view.indexAt(event.pos()):
+            self._set_pressed(QPersistentModelIndex())
+
+        return False
+
+    @staticmethod
+    def source_row(index: QModelIndex | QPersistentModelIndex) -> int:
+        """
+        Map the view row to the source model row.
+        :param index:
         :return:
         """
-        editor.setGeometry(option.rect)
+        model = index.model()
+        if isinstance(model, QAbstractProxyModel):
+            return model.mapToSource(model.index(index.row(), index.column())).row()
+
+        return index.row()
+
+    def _own(self, index: QModelIndex) -> QModelIndex:
+        """
+        Keep the index only if it is painted by this delegate.
+        :param index:
+        :return:
+        """
+        return index if index.isValid() and self.pnt_view.itemDelegateForColumn(index.column()) is self \
+            else QModelIndex()
+
+    def _set_pressed(self, index: QPersistentModelIndex) -> None:
+        self._update(self._pressed)
+        self._pressed = index
+        self._update(index)
+
+    def _update(self, index: QPersistentModelIndex) -> None:
+        if index.isValid():
+            self.pnt_view.update(QModelIndex(index))
@@ -1,20 +1,43 @@
 """
 YaPlayer main GUI module.
 """
+# pylint: disable=too-many-lines
+from __future__ import annotations
+from datetime import datetime
+from difflib import SequenceMatcher
+from itertools import count
+from math import inf
 from json import dump, load
-from os import getcwd, path, remove as os_rm
-from PyQt5 import uic
-from PyQt5.QtCore import QItemSelection, QModelIndex, QPoint, Qt, QUrl, QSize
-from PyQt5.QtGui import QCloseEvent, QPixmap
-from PyQt5.QtWidgets import QHeaderView, QMainWindow, QDialog, QLabel, QMessageBox as Qmb, QMenu, QAction, QToolButton
-from PyQt5.QtMultimedia import QMediaContent, QMediaPlayer, QMediaPlaylist
-from yandex_music.exceptions import NetworkError
-from yandex_music.track_short import TrackShort
-
+from os import path, remove as os_rm
+from time import monotonic
+from typing import TYPE_CHECKING
+from PyQt5.QtCore import QItemSelection, QModelIndex, QPoint, Qt, QTimer, QUrl, QSize
+from PyQt5.QtGui import QCloseEvent, QKeySequence, QPixmap
+from PyQt5.QtWidgets import QAbstractItemView, QHeaderView, QMainWindow, QDialog, QLabel, QMessageBox as Qmb, QMenu, \
+    QAction, QTableView, QToolButton
+
+from cache import TrackCache
 from dlg_button import ButtonDelegate
 from models.playlists import PlaylistsModel
+from models.proxy import TracksProxy
 from models.tracks import TracksModel
-from yaclient import YaClient, Track
+from startup import PROFILER
+from tracing import TRACER
+from uicache import setup_ui
+from workers import JobRunner
+
+if TYPE_CHECKING:
+    from PyQt5.QtMultimedia import QMediaContent, QMediaPlayer
+    from yandex_music import Playlist
+    from yandex_music import TrackShort
+    from covers import CoverStore
+    from playback import GaplessPlayer
+    from likes import LikesLoader
+    from offline import OfflineSync
+    from prefetch import TrackPrefetcher
+    from radio import SimilarRadio
+    from stream import StreamServer
+    from yaclient import YaClient, Track
 
 _APP_TITLE = 'Yandex player'
 
@@ -23,28 +46,42 @@ class YaPlayerWindow(QMainWindow):  # pylint: disable=too-many-instance-attribut
     """
     YaPlayer main GUI class.
     """
+    # Seconds the playlists and the likes are shown without the refresh when the tab is switched
+    FRESH_SEC = 300
+
     def __init__(self) -> None:
         super().__init__(flags=Qt.WindowType.Window)
-        uic.loadUi(path.join(getcwd(), 'ui/main.ui'), self)
+        setup_ui('main', self)
         with open('./ui/style.qss', 'r', encoding='utf-8') as fh:
-            self.setStyleSheet('\n'.join(fh.readlines()))
+            self.setStyleSheet(fh.read())
+        PROFILER.mark('ui')
 
-        with open('settings.json', 'r', encoding='utf-8') as fh:
-            settings = load(fh)
-            try:
-                self.resize(QSize(*settings.get('size', (600, 700))))
-                self.move(QPoint(*settings.get('pos', (0, 0))))
-            except (KeyError, ValueError) as e:
-                Qmb.critical(self, _APP_TITLE, f'Error: can\'t resize window\n{e}')
-                return
+        self.settings: dict = {}
+        if not self._load_settings():
+            return
+        PROFILER.mark('settings')
 
         # Yandex client
         self.is_logged = False
         self.__yac: YaClient = None
+        self.__prefetch: TrackPrefetcher = None
+        self.__stream: StreamServer = None
+        self.__offline: OfflineSync = None
+        self.__radio: SimilarRadio = None
+        self.__covers: CoverStore = None
+        # Cover labels waiting for the cover loading: track id and size of the wanted cover
+        self.__cover_labels: dict[QLabel, tuple[str, int]] = {}
+        self.__edit_seq = count()
+        self.__likes_pending = 0
+        self.__likes_loader: LikesLoader = None
+        self.__likes_streaming = False
+        self.__jobs = JobRunner(self)
         self.currtab_idx = 0
+        self.curr_kind: int | str = None
+        self.curr_revision: int = None
 
-        # Player
-        self.player = QMediaPlayer(self)
+        # Player, QtMultimedia is imported by the prewarm while Qt starts
+        self.player = self._create_player()
         self.player.error.connect(lambda err: Qmb.critical(self, 'Error', str(err)))
         self.player.durationChanged.connect(self._update_duration)
         self.player.positionChanged.connect(self._update_position)
@@ -52,22 +89,66 @@ class YaPlayerWindow(QMainWindow):  # pylint: disable=too-many-instance-attribut
         self.bt_pause.pressed.connect(self.player.pause)
         self.bt_stop.pressed.connect(self.player.stop)
         self.sld_vol.valueChanged.connect(self.player.setVolume)
-        self.qmpl_tracks = QMediaPlaylist()
-        self.qmpl_likes = QMediaPlaylist()
-        self.qmpl_similar = QMediaPlaylist()
+        from PyQt5.QtMultimedia import QMediaPlaylist  # pylint: disable=import-outside-toplevel
+        self.qmpl_tracks, self.qmpl_likes, self.qmpl_similar = QMediaPlaylist(), QMediaPlaylist(), QMediaPlaylist()
         self.player.setPlaylist(self.qmpl_tracks)
 
         # Models
         self.model_playlists = PlaylistsModel()
-        self.model_tracks = TracksModel(self.qmpl_tracks, 4)
-        self.model_likes = TracksModel(self.qmpl_likes, 3)
+        self.model_tracks = TracksModel(self.qmpl_tracks, 3)
+        self.model_likes = TracksModel(self.qmpl_likes, 2)
         self.lv_playlists.setModel(self.model_playlists)
-        self.tv_tracks.setModel(self.model_tracks)
-        self.tv_likes.setModel(self.model_likes)
+        self.tv_tracks.setModel(self._sort_proxy(self.model_tracks))
+        self.tv_likes.setModel(self._sort_proxy(self.model_likes))
 
         self._connect_signals()
         self._setup_ui()
+        self._setup_timers()
+        if TRACER.enabled:
+            self._setup_tracing()
         self.act_logout.setText("Login")
+        PROFILER.mark('window')
+
+    def _create_player(self) -> GaplessPlayer | QMediaPlayer:
+        """
+        Create the gapless player or the plain one by `playback` section of the settings.
+        :return:
+        """
+        # pylint: disable=import-outside-toplevel
+        from PyQt5.QtMultimedia import QMediaPlayer
+        from playback import GaplessPlayer
+        _playback = self.settings.get('playback', {})
+        if _playback.get('gapless', True):
+            return GaplessPlayer(self, _playback.get('crossfade_ms', 0))
+
+        return QMediaPlayer(self)
+
+    def _load_settings(self) -> bool:
+        """
+        Read the settings file once and restore the window geometry.
+        :return: False if the geometry can't be restored.
+        """
+        if path.exists('settings.json'):
+            with open('settings.json', 'r', encoding='utf-8') as fh:
+                self.settings = load(fh)
+        try:
+            self.resize(QSize(*self.settings.get('size', (600, 700))))
+            self.move(QPoint(*self.settings.get('pos', (0, 0))))
+        except (KeyError, ValueError) as e:
+            Qmb.critical(self, _APP_TITLE, f'Error: can\'t resize window\n{e}')
+            return False
+
+        return True
+
+    def _sort_proxy(self, model: TracksModel) -> TracksProxy:
+        """
+        Create the proxy model for sorting and filtering of the track table.
+        :param model:
+        :return:
+        """
+        proxy = TracksProxy(self)
+        proxy.setSourceModel(model)
+        return proxy
 
     def _connect_signals(self):
         """
@@ -76,8 +157,10 @@ class YaPlayerWindow(QMainWindow):  # pylint: disable=too-many-instance-attribut
         """
         self.tabWidget.currentChanged.connect(self.on_tab_changed)
         self.bt_like.pressed.connect(self._like_track)
-        self.bt_prev.pressed.connect(self.qmpl_tracks.previous)
-        self.bt_next.pressed.connect(self.qmpl_tracks.next)
+        self.bt_prev.pressed.connect(lambda: self._step(-1))
+        self.bt_next.pressed.connect(lambda: self._step(1))
+        self.le_filter_tracks.textChanged.connect(self.tv_tracks.model().set_filter)
+        self.le_filter_likes.textChanged.connect(self.tv_likes.model().set_filter)
         self.qmpl_tracks.currentIndexChanged.connect(self.on_track_selected_qmpl)
         self.qmpl_likes.currentIndexChanged.connect(self.on_track_selected_qmpl)
         self.qmpl_similar.currentIndexChanged.connect(self.on_track_similar_changed)
@@ -87,17 +170,19 @@ class YaPlayerWindow(QMainWindow):  # pylint: disable=too-many-instance-attribut
         self.tv_tracks.doubleClicked.connect(self.on_track_double_clicked)
         self.tv_likes.doubleClicked.connect(self.on_track_double_clicked)
         self.sld_time.valueChanged.connect(self.player.setPosition)
-        self.dlg_tracks_del = ButtonDelegate(self.tv_tracks, 'Удалить')
-        self.dlg_tracks_similar = ButtonDelegate(self.tv_tracks, 'Волна по треку')
-        self.dlg_tracks_like = ButtonDelegate(self.tv_tracks, 'Добавить в коллекцию')
-        self.dlg_likes_del = ButtonDelegate(self.tv_likes, 'Удалить')
-        self.dlg_likes_similar = ButtonDelegate(self.tv_likes, 'Волна по треку')
+        self.dlg_tracks_del = ButtonDelegate(self.tv_tracks, 'Удалить', 1)
+        self.dlg_tracks_similar = ButtonDelegate(self.tv_tracks, 'Волна по треку', 2)
+        self.dlg_tracks_like = ButtonDelegate(self.tv_tracks, 'Добавить в коллекцию', 3)
+        self.dlg_likes_del = ButtonDelegate(self.tv_likes, 'Удалить', 1)
+        self.dlg_likes_similar = ButtonDelegate(self.tv_likes, 'Волна по треку', 2)
         self.dlg_tracks_del.pressed.connect(self._delete_track)
         self.dlg_tracks_similar.pressed.connect(self._similar)
         self.dlg_tracks_like.pressed.connect(self._like_track)
         self.dlg_likes_del.pressed.connect(self._delete_track)
         self.dlg_likes_similar.pressed.connect(self._similar)
         self.act_update_likes.triggered.connect(self._update_likes)
+        self.act_sync_playlist.triggered.connect(self._sync_playlist)
+        self.act_sync_likes.triggered.connect(self._sync_likes)
         self.act_about.triggered.connect(self.on_about)
         self.act_logout.triggered.connect(self._logout)
 
@@ -106,17 +191,26 @@ class YaPlayerWindow(QMainWindow):  # pylint: disable=too-many-instance-attribut
         Table views and labels initialisatrion.
         :return:
         """
+        _bt = len(TracksModel.COLUMNS)
         for tv in (self.tv_tracks, self.tv_likes):
-            tv.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-            tv.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
-            tv.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.ResizeToContents)
-
-        self.tv_tracks.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeMode.ResizeToContents)
-        self.tv_tracks.setItemDelegateForColumn(1, self.dlg_tracks_del)
-        self.tv_tracks.setItemDelegateForColumn(2, self.dlg_tracks_similar)
-        self.tv_tracks.setItemDelegateForColumn(3, self.dlg_tracks_like)
-        self.tv_likes.setItemDelegateForColumn(1, self.dlg_likes_del)
-        self.tv_likes.setItemDelegateForColumn(2, self.dlg_likes_similar)
+            header = tv.horizontalHeader()
+            header.setVisible(True)
+            header.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+            for _col in range(3):
+                header.setSectionResizeMode(_col, QHeaderView.ResizeMode.Stretch)
+
+            # No sort column keeps the playlist order until a header is clicked
+            header.setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+            tv.setSortingEnabled(True)
+
+        self.tv_tracks.setItemDelegateForColumn(_bt, self.dlg_tracks_del)
+        self.tv_tracks.setItemDelegateForColumn(_bt + 1, self.dlg_tracks_similar)
+        self.tv_tracks.setItemDelegateForColumn(_bt + 2, self.dlg_tracks_like)
+        self.tv_likes.setItemDelegateForColumn(_bt, self.dlg_likes_del)
+        self.tv_likes.setItemDelegateForColumn(_bt + 1, self.dlg_likes_similar)
+        for tv, model in ((self.tv_tracks, self.model_tracks), (self.tv_likes, self.model_likes)):
+            tv.setIconSize(QSize(24, 24))
+            tv.verticalScrollBar().valueChanged.connect(lambda _, v=tv, m=model: self._visible_covers(v, m))
 
         mbar = self.menuBar()
         self.lb_user = QLabel(mbar)
@@ -127,23 +221,131 @@ class YaPlayerWindow(QMainWindow):  # pylint: disable=too-many-instance-attribut
 
         self.lbst = QLabel(self.status)
         self.status.addWidget(self.lbst)
-
-        _px = QPixmap('./ui/images/track.png')
-        self.lb_track_cover.setPixmap(_px)
-        self.lb_likes_cover.setPixmap(_px)
+        self.__jobs.progress.connect(self.lbst.setText)
+        self.__jobs.failed.connect(self._job_failed)
+        self.lv_playlists.setContextMenuPolicy(Qt.ContextMenuPolicy.ActionsContextMenu)
+        self.lv_playlists.addAction(self.act_sync_playlist)
+
+        # Bulk actions on the selected rows
+        self.act_delete_rows = QAction('Удалить выбранные', self)
+        self.act_delete_rows.setShortcut(QKeySequence.StandardKey.Delete)
+        self.act_delete_rows.triggered.connect(self._delete_selected)
+        self.act_like_rows = QAction('Добавить в коллекцию', self)
+        self.act_like_rows.triggered.connect(lambda: self._like_tracks(self._selected_tracks()[1]))
+        self.act_unlike_rows = QAction('Убрать из коллекции', self)
+        self.act_unlike_rows.triggered.connect(lambda: self._unlike_tracks(self._selected_tracks()[1]))
+        self.menu_copy_rows = QMenu('Копировать в плейлист', self)
+        self.menu_add_to_list = QMenu(self.bt_add_to_list)
+        for tv, actions in ((self.tv_tracks, (self.act_delete_rows, self.act_like_rows, self.act_unlike_rows)),
+                            (self.tv_likes, (self.act_delete_rows,))):
+            tv.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+            tv.setContextMenuPolicy(Qt.ContextMenuPolicy.ActionsContextMenu)
+            tv.addActions(actions)
+            tv.addAction(self.menu_copy_rows.menuAction())
+        self._setup_playlist_menus()
+
+        self.__no_cover = QPixmap('./ui/images/track.png')
+        self.lb_track_cover.setPixmap(self.__no_cover)
+        self.lb_likes_cover.setPixmap(self.__no_cover)
 
         self.setAcceptDrops(True)
 
+    def _setup_playlist_menus(self) -> None:
+        """
+        Keep the actions of the playlist menus in sync with the rows of the playlists model.
+        :return:
+        """
+        self.bt_add_to_list.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
+        self.bt_add_to_list.setMenu(self.menu_add_to_list)
+        self.lv_playlists.setIconSize(QSize(32, 32))
+        self.model_playlists.rowsInserted.connect(self._playlist_menus_inserted)
+        self.model_playlists.rowsRemoved.connect(self._playlist_menus_removed)
+        self.model_playlists.dataChanged.connect(self._playlist_menus_changed)
+
+    def _playlist_menus_inserted(self, _: QModelIndex, first: int, last: int) -> None:
+        for menu, slot in ((self.menu_add_to_list, self._add_to_list), (self.menu_copy_rows, self._copy_selected)):
+            actions = menu.actions()
+            before = actions[first] if first < len(actions) else None
+            for _pl in self.model_playlists.rows[first:last + 1]:
+                act = QAction(_pl[0], menu)
+                act.triggered.connect(lambda checked, kind=_pl[1], fn=slot: fn(kind))
+                menu.insertAction(before, act)
+
+    def _playlist_menus_removed(self, _: QModelIndex, first: int, last: int) -> None:
+        for menu in (self.menu_add_to_list, self.menu_copy_rows):
+            for act in menu.actions()[first:last + 1]:
+                menu.removeAction(act)
+                act.deleteLater()
+
+    def _playlist_menus_changed(self, top: QModelIndex, bottom: QModelIndex) -> None:
+        for menu in (self.menu_add_to_list, self.menu_copy_rows):
+            actions = menu.actions()
+            for row in range(top.row(), bottom.row() + 1):
+                actions[row].setText(self.model_playlists.rows[row][0])
+
+    def _setup_timers(self) -> None:
+        """
+        Create the timers of the background work.
+        :return:
+        """
+        self.tm_offline = QTimer(self)
+        self.tm_offline.setInterval(500)
+        self.tm_offline.timeout.connect(self._offline_progress)
+        # The cached tracks of lower quality are downloaded again while the link is idle
+        self.tm_upgrade = QTimer(self)
+        self.tm_upgrade.setInterval(30000)
+        self.tm_upgrade.timeout.connect(self._upgrade_cache)
+        # The collection is reconciled once after a burst of likes
+        self.tm_likes = QTimer(self)
+        self.tm_likes.setSingleShot(True)
+        self.tm_likes.setInterval(3000)
+        self.tm_likes.timeout.connect(self._update_likes)
+        # Monotonic time of the last refresh by the job key, the tab switch refreshes only the stale lists
+        self.__refreshed: dict[str, float] = {}
+
+    def _setup_tracing(self) -> None:
+        """
+        Stall detection timer, live counters at the status bar and the trace export action.
+        :return:
+        """
+        # The timers and the widgets are kept by their parents
+        heartbeat = QTimer(self)
+        heartbeat.setInterval(TRACER.TICK_MS)
+        heartbeat.timeout.connect(TRACER.heartbeat)
+        heartbeat.start()
+        label = QLabel(self.status)
+        self.status.addPermanentWidget(label)
+        counters = QTimer(self)
+        counters.setInterval(1000)
+        counters.timeout.connect(lambda: label.setText(TRACER.summary()))
+        counters.start()
+        export = QAction('Экспорт трассировки', self)
+        export.triggered.connect(self._export_trace)
+        self.menu.addAction(export)
+
+    def _export_trace(self) -> None:
+        fname = path.abspath(f'trace-{datetime.now():%Y%m%d-%H%M%S}.json')
+        TRACER.export(fname)
+        self.lbst.setText(f'Trace: {fname}')
+
     def closeEvent(self, event: QCloseEvent) -> None:   # pylint: disable=invalid-name
         """
         YaPlayer main window close handler.
         :param event:
         :return:
         """
+        self.__jobs.cancel_all()
+        if self.__prefetch is not None:
+            self.__prefetch.shutdown()
+        if self.__stream is not None:
+            self.__stream.stop()
+        if self.__offline is not None:
+            self.__offline.shutdown()
+
         if self.__yac is not None and self.__yac.clt.token:
             sz = self.size()
             pos = self.pos()
-            settings = {'TOKEN': self.__yac.clt.token, 'size': (sz.width(), sz.height()),
+            settings = {**self.settings, 'TOKEN': self.__yac.clt.token, 'size': (sz.width(), sz.height()),
                         'pos': (pos.x(), pos.y())}
             with open('settings.json', 'w', encoding='utf-8') as fh:
                 dump(settings, fh)
@@ -152,51 +354,130 @@ class YaPlayerWindow(QMainWindow):  # pylint: disable=too-many-instance-attribut
 
     def login(self) -> None:
         """
-        Creates the YaClient instance with given token.
-        Updates playlists list and likes list.
+        Creates the YaClient instance with given token, shows the library snapshot
+        and connects to the server in background.
         :return:
         """
-        _token = None
-        if path.exists('settings.json'):
-            with open('settings.json', 'r', encoding='utf-8') as fh:
-                _token = load(fh).get('TOKEN')
-
+        # The client modules load yandex_music and requests, they are imported on demand
+        # pylint: disable=import-outside-toplevel
+        from covers import CoverStore
+        from likes import LikesLoader
+        from offline import OfflineSync
+        from prefetch import TrackPrefetcher
+        from quality import QualityPolicy
+        from radio import SimilarRadio
+        from stream import StreamServer
+        from transport import PooledRequest
+        from yaclient import YaClient
+
+        _token = self.settings.get('TOKEN')
         if not _token:
             Qmb.critical(self, _APP_TITLE, 'You should get a token.\n'
                                            'See https://yandex-music.readthedocs.io/en/main/token.html')
             return
 
-        try:
-            self.__yac = YaClient(_token)
-        except NetworkError as e:
-            Qmb.critical(self, _APP_TITLE, f'Error:\n{e}')
-            return
-
-        self.is_logged = self.__yac.clt.me is not None
+        _quality = QualityPolicy.from_settings(self.settings.get('quality', {}))
+        if not self.settings.get('streaming', True):
+            # The playlists refer to the cache files before the download, so their codec can't change
+            _quality.fallback = None
+        self.__yac = YaClient(_token, self.settings.get('cache', {}).get('budget_mb', TrackCache.BUDGET_MB),
+                              PooledRequest.from_settings(self.settings.get('transport', {})), _quality)
+        if self.settings.get('streaming', True):
+            self.__stream = StreamServer(self.__yac)
+
+        _prefetch = self.settings.get('prefetch', {})
+        self.__prefetch = TrackPrefetcher(self.__yac, _prefetch.get('depth', TrackPrefetcher.DEPTH),
+                                          _prefetch.get('workers', TrackPrefetcher.WORKERS),
+                                          None if self.__stream is None else self.__stream.download)
+        self.__offline = OfflineSync(self.__yac, self.settings.get('offline', {}).get('workers', OfflineSync.WORKERS),
+                                     None if self.__stream is None else self.__stream.download)
+        self.__radio = SimilarRadio(self.__yac)
+        self.__covers = CoverStore(self.__yac, self)
+        self.__covers.ready.connect(self._cover_ready)
+        self.__likes_loader = LikesLoader(self.__yac, self)
+        self.__likes_loader.chunk.connect(self._likes_chunk)
+        self.__likes_loader.finished.connect(self._likes_finished)
+        self.model_tracks.covers = self.model_likes.covers = self.model_playlists.covers = \
+            lambda track_id, og_image: self.__covers.get(track_id, og_image, CoverStore.SMALL)
+        PROFILER.mark('client')
+
+        self._playlists_loaded(self.__yac.library.load_playlists(self.__yac.clt), snapshot=True)
+        _likes = self.__yac.library.load_tracks('likes', self.__yac.clt)
+        if _likes is not None:
+            self._set_likes(_likes)
+        PROFILER.mark('snapshot')
+
+        self.__jobs.submit('login', 'Вход', self.__yac.connect, on_done=self._logged_in)
+
+    def _logged_in(self, ok: bool) -> None:
+        """
+        Updates playlists list and likes list when the client is connected.
+        :param ok:
+        :return:
+        """
+        self.is_logged = ok
         if not self.is_logged:
             return
 
+        self.__jobs.submit('offline', 'Возобновление офлайн-загрузки', self.__offline.resume,
+                           on_done=lambda cnt: cnt and self.tm_offline.start())
+        if self.__yac.quality.upgrade:
+            self.tm_upgrade.start()
         self.act_logout.setText("Выйти из аккаунта")
         self.lb_user.setText(f'{self.__yac.clt.me.account.full_name} | {self.__yac.clt.me.default_email} ')
 
         self._update_playlists()
         self._update_likes()
 
+    def _job_failed(self, _: str, e: Exception) -> None:
+        """
+        Show the error of the background job, network errors are not modal since the snapshot is still usable.
+        :param _:
+        :param e:
+        :return:
+        """
+        from yandex_music.exceptions import NetworkError  # pylint: disable=import-outside-toplevel
+        if isinstance(e, NetworkError):
+            self.lbst.setText(f'Офлайн: {e}')
+            return
+
+        Qmb.critical(self, _APP_TITLE, f'Error:\n{e}')
+
     def _logout(self) -> None:
         """
         Removes the token, clears file cache and removes the YaClient instance.
         :return:
         """
+        self.__jobs.cancel_all()
         self.qmpl_likes.clear()
         if path.exists('settings.json'):
             os_rm('settings.json')
-            im = QPixmap('./images/track.png')
-            self.lb_likes_cover.setPixmap(im)
-            self.lb_track_cover.setPixmap(im)
+            self.lb_likes_cover.setPixmap(self.__no_cover)
+            self.lb_track_cover.setPixmap(self.__no_cover)
+            self.__cover_labels.clear()
+            self.model_tracks.covers = self.model_likes.covers = self.model_playlists.covers = None
+            self.__covers.clear()
+            self.__covers = None
             self.actionLog_Out.setText('Залогиниться')
             self.acc_name.setText('')
+            self.__prefetch.shutdown()
+            self.__prefetch = None
+            self.__offline.shutdown()
+            self.__offline = None
+            self.__radio = None
+            self.__refreshed.clear()
+            self.tm_offline.stop()
+            self.tm_upgrade.stop()
+            self.tm_likes.stop()
+            self.__likes_loader.cancel()
+            self.__likes_loader = None
+            if self.__stream is not None:
+                self.__stream.stop()
+                self.__stream = None
+
             self.__yac.clear_cache()
             self.__yac = None
+            self.settings.pop('TOKEN', None)
             self.is_logged = False
         else:
             Qmb.critical(self, _APP_TITLE, 'You are not logged in')
@@ -212,15 +493,93 @@ class YaPlayerWindow(QMainWindow):  # pylint: disable=too-many-instance-attribut
         else:
             _tr = self.__yac.playlist[row]
 
-        try:
-            if _tr.like():
-                self.lbst.setText(f'Track `{_tr.title}` liked')
-            else:
-                Qmb.warning(self, _APP_TITLE, 'Не получается поставить лайк')
-        except NetworkError as e:
-            Qmb.critical(self, _APP_TITLE, f'Error:\n{e}')
+        if str(_tr.id) in self.__yac.liked:
+            self._unlike_tracks([_tr])
+        else:
+            self._like_tracks([_tr])
 
-        self._update_likes()
+    def _selected_tracks(self) -> tuple[list[int], list[Track]]:
+        """
+        Get the selected rows of the current tab in the playlist order.
+        :return: Rows and tracks.
+        """
+        if self.__yac is None:
+            return [], []
+        if self.currtab_idx == 0:
+            view, plist = self.tv_tracks, self.__yac.playlist
+        elif self.currtab_idx == 1:
+            view, plist = self.tv_likes, self.__yac.likes
+        else:
+            return [], []
+
+        rows = sorted({ButtonDelegate.source_row(_idx) for _idx in view.selectionModel().selectedRows()})
+        return rows, [plist[_r] for _r in rows]
+
+    def _like_tracks(self, tracks: list[Track]) -> None:
+        """
+        Like the tracks with a single request, the collection is updated before the request is sent.
+        :param tracks:
+        :return:
+        """
+        tracks = [_tr for _tr in tracks if str(_tr.id) not in self.__yac.liked]
+        if tracks:
+            self._apply_likes(added=tracks)
+            self.__likes_pending += 1
+            self.__jobs.submit(f'like {next(self.__edit_seq)}', f'Лайк: {len(tracks)}',
+                               self.__yac.clt.users_likes_tracks_add, [_tr.id for _tr in tracks],
+                               on_done=lambda ok, trs=tracks: self._likes_sent(ok, added=trs),
+                               on_error=lambda e, trs=tracks: self._likes_sent(False, added=trs, error=e))
+
+    def _unlike_tracks(self, tracks: list[Track]) -> None:
+        """
+        Remove the tracks from the collection with a single request, the collection is updated before
+        the request is sent.
+        :param tracks:
+        :return:
+        """
+        tracks = [_tr for _tr in tracks if str(_tr.id) in self.__yac.liked]
+        if tracks:
+            self._apply_likes(removed=tracks)
+            self.__likes_pending += 1
+            self.__jobs.submit(f'unlike {next(self.__edit_seq)}', f'Удаление из коллекции: {len(tracks)}',
+                               self.__yac.clt.users_likes_tracks_remove, [_tr.id for _tr in tracks],
+                               on_done=lambda ok, trs=tracks: self._likes_sent(ok, removed=trs),
+                               on_error=lambda e, trs=tracks: self._likes_sent(False, removed=trs, error=e))
+
+    def _apply_likes(self, added: list[Track]=(), removed: list[Track]=()) -> None:
+        """
+        Update the liked ids, the collection rows and the like state of the track rows.
+        :param added:
+        :param removed:
+        :return:
+        """
+        added_ids = {str(_tr.id) for _tr in added}
+        removed_ids = {str(_tr.id) for _tr in removed}
+        self.__yac.liked |= added_ids
+        self.__yac.liked -= removed_ids
+        self._apply_diff(self.model_likes, self.__yac.likes,
+                         list(added) + [_tr for _tr in self.__yac.likes if str(_tr.id) not in removed_ids])
+        for model in (self.model_tracks, self.model_likes):
+            model.set_liked(added_ids, True)
+            model.set_liked(removed_ids, False)
+
+    def _likes_sent(self, ok: bool, added: list[Track]=(), removed: list[Track]=(), error: Exception=None) -> None:
+        """
+        Roll back the optimistic update if the request failed, reconcile the collection later otherwise.
+        :param ok:
+        :param added:
+        :param removed:
+        :param error:
+        :return:
+        """
+        self.__likes_pending -= 1
+        if ok:
+            self.lbst.setText(f'Collection updated: +{len(added)} / -{len(removed)}')
+        else:
+            self._apply_likes(added=removed, removed=added)
+            self.lbst.setText(f'Не получается изменить коллекцию{f": {error}" if error else ""}')
+
+        self.tm_likes.start()
 
     def _similar(self, row: int) -> None:
         if self.currtab_idx == 0:
@@ -230,124 +589,351 @@ class YaPlayerWindow(QMainWindow):  # pylint: disable=too-many-instance-attribut
         else:
             return
 
-        try:
-            if self.__yac.load_similar(_tid):
-                self.qmpl_similar.clear()
-                for _tr in self.__yac.similar:
-                    self.qmpl_similar.addMedia(QMediaContent(
-                        QUrl(f'file://{YaClient.TRACKS_DIR}/{", ".join(_tr.artists_name())} - '
-                             f'{_tr.title}.{YaClient.CODEC}')))
-
-                self.player.setPlaylist(self.qmpl_similar)
-                self.bt_prev.pressed.disconnect()
-                self.bt_next.pressed.disconnect()
-                self.bt_prev.pressed.connect(self.qmpl_similar.previous)
-                self.bt_next.pressed.connect(self.qmpl_similar.next)
-                self.qmpl_similar.setCurrentIndex(0)
-                self.player.play()
-            else:
-                Qmb.information(self, _APP_TITLE, 'Похожие треки не найдены')
-        except NetworkError as e:
-            Qmb.critical(self, _APP_TITLE, f'Error:\n{e}')
+        self.__jobs.cancel('radio')
+        self.__jobs.submit('similar', 'Поиск похожих треков', self.__radio.start, _tid,
+                           on_done=self._similar_loaded)
+
+    def _similar_loaded(self, tracks: list[Track]) -> None:
+        if len(tracks) == 0:
+            Qmb.information(self, _APP_TITLE, 'Похожие треки не найдены')
+            return
+
+        self.__yac.similar = tracks
+        self.qmpl_similar.clear()
+        self.qmpl_similar.addMedia(self._media(tracks))
+        self.player.setPlaylist(self.qmpl_similar)
+        self.qmpl_similar.setCurrentIndex(0)
+        self.player.play()
+
+    def _radio_extend(self, tracks: list[Track]) -> None:
+        """
+        Append the next batch of the radio to the queue, the playing track is not interrupted.
+        :param tracks:
+        :return:
+        """
+        if not tracks:
+            return
+
+        idx = self.qmpl_similar.currentIndex()
+        start = len(self.__yac.similar)
+        self.__yac.similar.extend(tracks)
+        self.qmpl_similar.addMedia(self._media(tracks))
+        if self.player.playlist() is not self.qmpl_similar:
+            return
+
+        from PyQt5.QtMultimedia import QMediaPlayer  # pylint: disable=import-outside-toplevel
+        if idx < 0 and self.player.state() == QMediaPlayer.StoppedState:
+            # The queue has run out before the batch came
+            self.qmpl_similar.setCurrentIndex(start)
+            self.player.play()
+        else:
+            self.__prefetch.schedule(self.__yac.similar, idx)
 
     def _delete_track(self, row: int) -> None:
         if self.__yac is None:
             Qmb.critical(self, _APP_TITLE, 'Нужно залогиниться с помощью токена', defaultButton=Qmb.Ok)
             return
-        if Qmb.StandardButton.Yes != Qmb.question(self, _APP_TITLE, 'Удалить трек из списка?'):
+
+        self._delete_rows([row])
+
+    def _delete_selected(self) -> None:
+        rows, _ = self._selected_tracks()
+        if rows:
+            self._delete_rows(rows)
+
+    def _delete_rows(self, rows: list[int]) -> None:
+        """
+        Remove the rows of the current tab with a single request.
+        The rows are of the shown playlist, which may be not selected at the list.
+        :param rows:
+        :return:
+        """
+        _pl = self._shown_playlist()
+        if self.currtab_idx == 0 and _pl is None:
+            return
+
+        question = 'Удалить трек из списка?' if len(rows) == 1 else f'Удалить треки из списка: {len(rows)}?'
+        if Qmb.StandardButton.Yes != Qmb.question(self, _APP_TITLE, question):
             return
 
         if self.currtab_idx == 0:
-            sel = self.lv_playlists.selectionModel().selection()
-            pl_row = sel.indexes()[0].row()
-            _pl = self.model_playlists.rows[pl_row]
-            _list = self.__yac.playlist
-            track = self.__yac.playlist[row]
-            try:
-                _updated = self.__yac.clt.users_playlists_delete_track(_pl[1], row, row+1, _pl[2])
-                if _updated is None:
-                    return
-
-                self.model_playlists.rows[pl_row] = (_pl[0], _pl[1], _updated.revision)
-                if len(_updated.tracks) > 0:
-                    _list.clear()
-                    for _tr in _updated.tracks:
-                        if isinstance(_tr, TrackShort):
-                            _tr = _tr.track
-
-                        _list.append(_tr)
+            keys = self.__yac.occurrences(self.__yac.playlist)
+            self._edit_playlist(_pl, delete={keys[_r] for _r in rows})
+        elif self.currtab_idx == 1:
+            self._unlike_tracks([self.__yac.likes[_r] for _r in rows])
+
+    def _copy_selected(self, kind: int | str) -> None:
+        """
+        Copy the selected tracks of the current tab to the playlist.
+        :param kind:
+        :return:
+        """
+        _, tracks = self._selected_tracks()
+        row = self.model_playlists.row_of(kind)
+        if row < 0:
+            return
+
+        plist = self.model_playlists.rows[row]
+        if tracks and not (self.currtab_idx == 0 and self.curr_kind == plist[1]):
+            self._edit_playlist(plist, insert=tracks)
+
+    def _shown_playlist(self) -> tuple[str, int, int, int, str] | None:
+        """
+        Find the row of the playlist shown at the tracks table.
+        :return: None if the playlist has been removed from the list.
+        """
+        row = self.model_playlists.row_of(self.curr_kind)
+        if row < 0:
+            self.lbst.setText('Плейлист не найден')
+            return None
+
+        return self.model_playlists.rows[row]
+
+    def _edit_playlist(self, plist: tuple[str, int, int], delete: set[tuple[str, int]]=frozenset(),
+                       insert: list[Track]=()) -> None:
+        """
+        Send the batched playlist edit, the edits are applied one by one in background.
+        :param plist:
+        :param delete: `YaClient.occurrences` keys of the rows to remove.
+        :param insert: Tracks to insert at the top.
+        :return:
+        """
+        self.__jobs.submit(f'edit {plist[1]} {next(self.__edit_seq)}', f'Изменение `{plist[0]}`',
+                           self.__yac.change_playlist, plist[1], delete, insert,
+                           on_done=lambda res, kind=plist[1]: self._playlist_edited(kind, res))
+
+    def _playlist_edited(self, kind: int, res: tuple[int, list[Track]]) -> None:
+        for _pl in self.model_playlists.rows:
+            if _pl[1] == kind:
+                if self.curr_kind == kind:
+                    self._playlist_loaded(_pl, res)
                 else:
-                    self.on_playlist_selected(sel)
-            except NetworkError as e:
-                Qmb.critical(self, _APP_TITLE, f'Error:\n{e}')
-                return
+                    self.model_playlists.set_revision(kind, res[0], len(res[1]))
+                    self.lbst.setText(f'{_pl[0]} updated')
+                break
 
-        elif self.currtab_idx == 1:
-            track = self.__yac.likes[row]
-            if self.__yac.clt.users_likes_tracks_remove(track.id):
-                self._update_likes()
-        else:
+    def _sync_playlist(self) -> None:
+        """
+        Download all tracks of the shown playlist for offline use.
+        :return:
+        """
+        _pl = self._shown_playlist() if self.__offline is not None else None
+        if _pl is None:
+            return
+
+        self.__jobs.submit('offline', f'Загрузка `{_pl[0]}`', self.__yac.fetch_list, _pl[0], _pl[1],
+                           on_done=lambda tracks, pl=_pl: self._sync_tracks(pl[0], self.__yac.full_tracks(tracks)))
+
+    def _sync_likes(self) -> None:
+        """
+        Download all liked tracks for offline use.
+        :return:
+        """
+        if self.__offline is not None:
+            self._sync_tracks('likes', self.__yac.likes)
+
+    def _sync_tracks(self, name: str, tracks: list[Track]) -> None:
+        self.__offline.sync(name, tracks)
+        self.tm_offline.start()
+
+    def _offline_progress(self) -> None:
+        self.lbst.setText(self.__offline.progress())
+        if not self.__offline.is_active():
+            self.tm_offline.stop()
+
+    def _upgrade_cache(self) -> None:
+        if self.__offline.is_active() or self.__yac.clt.request.stats.idle_for() < self.__yac.quality.IDLE_SEC:
             return
 
-        self.lbst.setText(f'Track `{track.title}` removed')
+        self.__jobs.submit('upgrade', 'Повышение качества кэша', self.__yac.upgrade_cache,
+                           on_error=lambda e: self.lbst.setText(f'Повышение качества не удалось: {e}'))
 
     def _update_playlists(self) -> None:
         if self.__yac is None:
             Qmb.critical(self, "Update Error", "You are not logged in", defaultButton=Qmb.Ok)
             return
 
-        try:
-            self.model_playlists.update_data(self.__yac.clt.users_playlists_list())
-        except NetworkError as e:
-            Qmb.critical(self, _APP_TITLE, f'Error:\n{e}')
-            return
+        self.__jobs.submit('playlists', 'Обновление плейлистов', self.__yac.fetch_playlists,
+                           on_done=self._playlists_loaded)
 
-        add_menu = QMenu(self.bt_add_to_list)
-        for _i, _pl in enumerate(self.model_playlists.rows):
-            act = QAction(_pl[0], self)
-            act.triggered.connect(lambda checked, pl_idx=_i: self._add_to_list(pl_idx))
-            add_menu.addAction(act)
+    def _playlists_loaded(self, playlists: list[Playlist], snapshot: bool=False) -> None:
+        # The menus follow the model rows
+        self.model_playlists.update_data(playlists)
+        if snapshot:
+            return
 
-        self.bt_add_to_list.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
-        self.bt_add_to_list.setMenu(add_menu)
+        self.__refreshed['playlists'] = monotonic()
         self.lbst.setText('Playlists updated')
+        # The shown playlist is fetched again only if it has been changed elsewhere
+        row = self.model_playlists.row_of(self.curr_kind)
+        if row >= 0 and self.model_playlists.rows[row][2] != self.curr_revision and \
+                'playlist' not in self.__jobs.jobs:
+            _pl = self.model_playlists.rows[row]
+            self.__jobs.submit('playlist', f'Обновление `{_pl[0]}`', self.__yac.fetch_playlist, _pl[1],
+                               on_done=lambda res, pl=_pl: self._playlist_loaded(pl, res))
+
+    def _revalidate(self, key: str) -> None:
+        """
+        Refresh the list in background when it is older than the freshness window, the last known rows are shown
+        meanwhile and only the changes are applied.
+        :param key: 'playlists' or 'likes'.
+        :return:
+        """
+        fresh_sec = self.settings.get('refresh', {}).get('fresh_sec', YaPlayerWindow.FRESH_SEC)
+        if self.__yac is None or key in self.__jobs.jobs or monotonic() - self.__refreshed.get(key, -inf) < fresh_sec:
+            return
+
+        if key == 'playlists':
+            self._update_playlists()
+        else:
+            self._update_likes()
 
     def _update_likes(self) -> None:
-        if not self.is_logged:
+        if self.__yac is None:
             Qmb.critical(self, "Update Error", "You are not logged in", defaultButton=Qmb.Ok)
             return
 
-        try:
-            self.__yac.load_list('likes')
-        except NetworkError as e:
-            Qmb.critical(self, _APP_TITLE, f'Error:\n{e}')
+        self.__jobs.submit('likes', 'Обновление коллекции', self.__yac.sync_likes, on_done=self._likes_loaded)
+
+    def _likes_loaded(self, res: tuple[int, list[TrackShort]] | None) -> None:
+        self.__refreshed['likes'] = monotonic()
+        if res is None:
+            return
+
+        # Without the rows shown the chunks are streamed into the table as they arrive
+        self.__likes_streaming = not self.__yac.likes
+        self.__likes_loader.start(*res)
+
+    def _likes_chunk(self, tracks: list[Track]) -> None:
+        self.lbst.setText(self.__likes_loader.progress())
+        if not self.__likes_streaming:
             return
 
-        self._update_media(self.model_likes, self.qmpl_likes, self.__yac.likes)
+        ids = {str(_tr.id) for _tr in tracks}
+        self.__yac.liked |= ids
+        self.model_likes.insert_rows(len(self.__yac.likes), tracks,
+                                     self._media(tracks), self.__yac.liked)
+        self.__yac.likes.extend(tracks)
+        self.model_tracks.set_liked(ids, True)
+
+    def _likes_finished(self, revision: int | None, tracks: list[Track]) -> None:
+        self.__likes_streaming = False
+        if self.__likes_pending:
+            # The result may miss the likes which are being sent, it is fetched again when they are done
+            return
+
+        self._set_likes((revision, tracks))
+        if revision is None:
+            self.lbst.setText('Коллекция загружена не полностью')
+            return
+
+        self.__jobs.submit('likes save', 'Сохранение коллекции', self.__yac.library.save_tracks, 'likes', revision,
+                           tracks)
         self.lbst.setText('Likes updated')
 
-    def _update_media(self, model: TracksModel, playlist: QMediaPlaylist, tracks: list[Track]) -> None:
-        if not self.is_logged:
+    def _set_likes(self, res: tuple[int, list[Track]]) -> None:
+        """
+        Replace the collection with the reconciled one, only the changed rows are updated.
+        :param res: Revision and tracks, the revision is None if the collection is loaded partially.
+        :return:
+        """
+        revision, tracks = res
+        liked = {str(_tr.id) for _tr in tracks}
+        added, removed = liked - self.__yac.liked, self.__yac.liked - liked
+        if revision is not None:
+            self.__yac.likes_revision = revision
+        self.__yac.liked = liked
+        if self.__yac.likes:
+            self._apply_diff(self.model_likes, self.__yac.likes, tracks)
+        else:
+            self.__yac.update_playlist(self.__yac.likes, tracks)
+            self._update_media(self.model_likes, self.__yac.likes)
+
+        self.model_tracks.set_liked(added, True)
+        self.model_tracks.set_liked(removed, False)
+
+    def _update_media(self, model: TracksModel, tracks: list[Track]) -> None:
+        if self.__yac is None:
+            return
+
+        model.set_tracks(tracks, self._media(tracks), self.__yac.liked)
+
+    def _show_cover(self, label: QLabel, track_id: str, og_image: str | None, size: int) -> None:
+        """
+        Show the cover at the label, the placeholder is shown until the cover is loaded.
+        :param label:
+        :param track_id:
+        :param og_image:
+        :param size:
+        :return:
+        """
+        self.__cover_labels[label] = (track_id, size)
+        label.setPixmap(self.__covers.get(track_id, og_image, size) or self.__no_cover)
+
+    def _cover_ready(self, track_id: str, size: int) -> None:
+        """
+        Show the loaded cover at the waiting labels and table rows.
+        :param track_id:
+        :param size:
+        :return:
+        """
+        if size == self.__covers.SMALL:
+            self.model_tracks.cover_loaded(track_id)
+            self.model_likes.cover_loaded(track_id)
+            self.model_playlists.cover_loaded(track_id)
+
+        for label, key in self.__cover_labels.items():
+            if key == (track_id, size):
+                label.setPixmap(self.__covers.get(track_id, None, size))
+
+    def _visible_covers(self, view: QTableView, model: TracksModel) -> None:
+        """
+        Drop the queued thumbnail loads of the rows scrolled out of the view.
+        :param view:
+        :param model:
+        :return:
+        """
+        top = view.rowAt(0)
+        if self.__covers is None or top < 0:
             return
 
-        playlist.clear()
-        for _tr in tracks:
-            playlist.addMedia(QMediaContent(
-                QUrl(f'file://{YaClient.TRACKS_DIR}/{", ".join(_tr.artists_name())} - {_tr.title}.{YaClient.CODEC}')))
+        bottom = view.rowAt(view.viewport().height() - 1)
+        proxy = view.model()
+        keep = {model.rows[proxy.mapToSource(proxy.index(_r, 0)).row()].track_id
+                for _r in range(top, (proxy.rowCount() - 1 if bottom < 0 else bottom) + 1)}
+        keep.update(_k[0] for _k in self.__cover_labels.values())
+        self.__covers.cancel_except(keep, self.__covers.SMALL)
 
-        model.layoutChanged.emit()
+    def _media(self, tracks: list[Track]) -> list[QMediaContent]:
+        """
+        Get the media of the tracks for the playlist.
+        :param tracks:
+        :return:
+        """
+        from PyQt5.QtMultimedia import QMediaContent  # pylint: disable=import-outside-toplevel
+        return [QMediaContent(self._media_url(_tr)) for _tr in tracks]
 
-    def _add_to_list(self, pl_idx: int) -> None:
+    def _media_url(self, track: Track) -> QUrl:
+        """
+        Get the URL of the track for QMediaPlayer: local streaming server or cache file.
+        :param track:
+        :return:
+        """
+        if self.__stream is not None:
+            return QUrl(self.__stream.url(track))
+
+        return QUrl.fromLocalFile(self.__yac.track_path(track))
+
+    def _add_to_list(self, kind: int | str) -> None:
         curr_pl = self.player.playlist()
         idx = curr_pl.currentIndex()
         if idx == -1:
             return
 
-        plist = self.model_playlists.rows[pl_idx]
+        plist = self.model_playlists.rows[self.model_playlists.row_of(kind)]
         if curr_pl is self.qmpl_tracks:
             track_list = self.__yac.playlist
-            curr_pl_name = self.model_playlists.data(self.lv_playlists.currentIndex(), 0)
-            if curr_pl_name == plist[0]:
+            if self.curr_kind == plist[1]:
                 return
         elif curr_pl is self.qmpl_similar:
             track_list = self.__yac.similar
@@ -356,18 +942,7 @@ class YaPlayerWindow(QMainWindow):  # pylint: disable=too-many-instance-attribut
         else:
             return
 
-        track = track_list[idx]
-        try:
-            new_pl = self.__yac.clt.users_playlists_insert_track(plist[1], track.id, track.albums[0].id,
-                                                                 revision=plist[2])
-        except NetworkError as e:
-            Qmb.critical(self, _APP_TITLE, f'Error:\n{e}')
-            return
-
-        if new_pl is not None:
-            self.model_playlists.rows[pl_idx] = (plist[0], plist[1], new_pl.revision)
-
-        self.lbst.setText(f'`{track.title}` added to `{plist[0]}`')
+        self._edit_playlist(plist, insert=[track_list[idx]])
 
     def _update_duration(self, duration: int) -> None:
         """
@@ -400,61 +975,106 @@ class YaPlayerWindow(QMainWindow):  # pylint: disable=too-many-instance-attribut
         :param _:
         :return:
         """
+        if sel.isEmpty():
+            return
+
         _pl = self.model_playlists.rows[sel.indexes()[0].row()]
-        try:
-            self.__yac.load_list(_pl[0], _pl[1])
-        except NetworkError as e:
-            Qmb.critical(self, _APP_TITLE, f'Error:\n{e}')
+        tracks = self.__yac.cached_playlist(_pl[1], _pl[2])
+        if tracks is not None:
+            # The load of the playlist selected before would replace the cached one
+            self.__jobs.cancel('playlist')
+            self._playlist_loaded(_pl, (_pl[2], tracks))
             return
 
-        self._update_media(self.model_tracks, self.qmpl_tracks, self.__yac.playlist)
-        self.lbst.setText(f'{_pl[0]} updated')
+        self.__jobs.submit('playlist', f'Загрузка `{_pl[0]}`', self.__yac.fetch_playlist, _pl[1],
+                           on_done=lambda res, pl=_pl: self._playlist_loaded(pl, res))
 
-    def on_track_selected(self, curr: QItemSelection, prev: QItemSelection) -> None:
+    def _playlist_loaded(self, plist: tuple[str, str, int], res: tuple[int, list[Track]]) -> None:
         """
-        Update labels and buttons when track is selected.
-        :param curr:
-        :param prev:
+        Show the playlist tracks, only the changed rows are updated if the playlist is already shown.
+        The tracks of the playlist which is not selected anymore are not shown, only its revision is updated.
+        :param plist:
+        :param res: Revision and tracks.
         :return:
         """
-        if curr.isEmpty():
+        revision, tracks = res
+        if plist[1] != self._selected_kind():
+            self.model_playlists.set_revision(plist[1], revision, len(tracks))
             return
 
+        if self.curr_kind == plist[1]:
+            if revision == self.curr_revision:
+                return
+
+            self._apply_diff(self.model_tracks, self.__yac.playlist, tracks)
+            self.__yac.update_playlist(self.__yac.playlist, tracks)
+        else:
+            self.curr_kind = plist[1]
+            self.__yac.update_playlist(self.__yac.playlist, tracks)
+            self._update_media(self.model_tracks, self.__yac.playlist)
+
+        self.curr_revision = revision
+        self.model_playlists.set_revision(plist[1], revision, len(tracks))
+        self.lbst.setText(f'{plist[0]} updated')
+
+    def _selected_kind(self) -> int | str | None:
+        """
+        Get the kind of the playlist selected at the list, the shown one if there is no selection.
+        :return:
+        """
+        rows = self.lv_playlists.selectionModel().selectedRows()
+        return self.model_playlists.rows[rows[0].row()][1] if rows else self.curr_kind
+
+    def _apply_diff(self, model: TracksModel, plist: list[Track], tracks: list[Track]) -> None:
+        """
+        Insert and remove only the changed rows, so the playback and the selection are kept.
+        :param model:
+        :param plist:
+        :param tracks:
+        :return:
+        """
+        matcher = SequenceMatcher(None, [str(_tr.id) for _tr in plist], [str(_tr.id) for _tr in tracks],
+                                  autojunk=False)
+        for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+            if tag == 'equal':
+                continue
+            if i2 > i1:
+                model.remove_rows(i1, i2 - 1)
+                del plist[i1:i2]
+            if j2 > j1:
+                model.insert_rows(i1, tracks[j1:j2], self._media(tracks[j1:j2]), self.__yac.liked)
+                plist[i1:i1] = tracks[j1:j2]
+
+    def on_track_selected(self, curr: QItemSelection, _: QItemSelection) -> None:
+        """
+        Update labels of the table which selection has been changed, the playing one may be at other tab.
+        :param curr:
+        :return:
+        """
         self.lbst.setText('')
 
-        row = curr.indexes()[0].row()
-        if self.currtab_idx == 0:
+        if self.sender() is self.tv_tracks.selectionModel():
             view = self.tv_tracks
             model = self.model_tracks
             cover = self.lb_track_cover
             title = self.lb_track_title
-            track = self.__yac.playlist[row]
-        elif self.currtab_idx == 1:
+        elif self.sender() is self.tv_likes.selectionModel():
             view = self.tv_likes
             model = self.model_likes
             cover = self.lb_likes_cover
             title = self.lb_likes_title
-            track = self.__yac.likes[row]
         else:
             return
 
-        artists = ", ".join(track.artists_name())
-        cover_name = f'{artists} - {track.title}'.replace('/', '\\')
-        cover.setPixmap(QPixmap(f'{YaClient.COVERS_DIR}/{cover_name}.png'))
-        album = f'{track.albums[0].title} [{track.albums[0].year}]' if len(track.albums) > 0 else ''
-        duration = f'{track.duration_ms//60000}:{track.duration_ms%60000//1000:02d}'
-        title.setText(f'<b>{artists}</b><br><br>{track.title} [<b>{duration}</b>]<br><br><b>Альбом</b><br>{album}')
-        view.openPersistentEditor(model.index(row, 1))
-        view.openPersistentEditor(model.index(row, 2))
-        if model.col_cnt == 4:
-            view.openPersistentEditor(model.index(row, 3))
-
-        if not prev.isEmpty():
-            row = prev.indexes()[0].row()
-            view.closePersistentEditor(model.index(row, 1))
-            view.closePersistentEditor(model.index(row, 2))
-            if model.col_cnt == 4:
-                view.closePersistentEditor(model.index(row, 3))
+        # The bulk actions of the multiple selection are at the context menu
+        if curr.isEmpty() or len(view.selectionModel().selectedRows()) > 1:
+            return
+
+        row = ButtonDelegate.source_row(curr.indexes()[0])
+        _tr = model.rows[row]
+        self._show_cover(cover, _tr.track_id, _tr.cover, self.__covers.LARGE)
+        title.setText(f'<b>{_tr.artists}</b><br><br>{_tr.title} [<b>{_tr.length}</b>]<br><br>'
+                      f'<b>Альбом</b><br>{_tr.album}')
 
     def on_track_double_clicked(self, idx: QModelIndex) -> None:
         """
@@ -474,79 +1094,124 @@ class YaPlayerWindow(QMainWindow):  # pylint: disable=too-many-instance-attribut
         else:
             return
 
-        qmpl.setCurrentIndex(idx.row())
+        # The tab switch doesn't interrupt the playing list, it is changed by the track chosen
+        if self.player.playlist() is not qmpl:
+            self.player.setPlaylist(qmpl)
+        qmpl.setCurrentIndex(ButtonDelegate.source_row(idx))
         self.player.play()
         view.setCurrentIndex(idx)
 
     def on_track_selected_qmpl(self, idx: int) -> None:
         """
-        Update labels when track changed at QMediaPlaylist.
+        Update labels when track changed at the playing QMediaPlaylist.
+        The index of other list is moved by the row updates only.
         :param idx:
         :return:
         """
-        if idx < 0:
+        qmpl = self.sender()
+        if idx < 0 or qmpl is not self.player.playlist():
             return
 
-        if self.currtab_idx == 0:
-            track = self.__yac.playlist[idx]
+        if qmpl is self.qmpl_tracks:
+            tracks = self.__yac.playlist
             view = self.tv_tracks
             model = self.model_tracks
-        elif self.currtab_idx == 1:
-            track = self.__yac.likes[idx]
+        elif qmpl is self.qmpl_likes:
+            tracks = self.__yac.likes
             view = self.tv_likes
             model = self.model_likes
         else:
             return
 
-        try:
-            self.__yac.download_track(track)
-        except NetworkError as e:
-            Qmb.critical(self, _APP_TITLE, f'Error:\n{e}')
-            return
-
-        track_name = f'{", ".join(track.artists_name())} - {track.title}'.replace('/', '\\')
-        self.lb_curr_cover.setPixmap(QPixmap(f'{YaClient.COVERS_DIR}/{track_name}.png'))
-        self.lb_curr_title.setText(track_name)
-        view.setCurrentIndex(model.index(idx, 2))
+        if self._play_track(tracks, idx):
+            view.setCurrentIndex(view.model().mapFromSource(model.index(idx, 1)))
 
     def on_track_similar_changed(self, idx: int) -> None:
         """
-        Update labels when track changed at QMediaPlaylist.
+        Update labels when track changed at the radio queue and fetch the next batch when few tracks are left.
         :param idx:
         :return:
         """
-        track = self.__yac.similar[idx]
-        try:
-            self.__yac.download_track(track)
-        except NetworkError as e:
-            Qmb.critical(self, _APP_TITLE, f'Error:\n{e}')
+        if idx < 0:
             return
 
-        track_name = f'{", ".join(track.artists_name())} - {track.title}'.replace('/', '\\')
-        self.lb_curr_cover.setPixmap(QPixmap(f'{YaClient.COVERS_DIR}/{track_name}.png'))
-        self.lb_curr_title.setText(track_name)
+        if self._play_track(self.__yac.similar, idx):
+            self.__radio.played(self.__yac.similar[idx])
+        if self.__radio.needs_more(idx, len(self.__yac.similar)) and 'radio' not in self.__jobs.jobs:
+            self.__jobs.submit('radio', 'Волна: следующие треки', self.__radio.next_batch,
+                               on_done=self._radio_extend)
+
+    def _play_track(self, tracks: list[Track], idx: int) -> bool:
+        """
+        Make the current track playable, update labels and prefetch the next tracks.
+        Without streaming the track is downloaded before it starts to play.
+        :param tracks:
+        :param idx:
+        :return:
+        """
+        track = tracks[idx]
+        if self.__stream is None:
+            from yandex_music.exceptions import NetworkError  # pylint: disable=import-outside-toplevel
+            try:
+                self.__prefetch.fetch(track)
+            except NetworkError as e:
+                # The transport has retried already, the error is shown without blocking the player
+                self.lbst.setText(f'Офлайн: {e}')
+                return False
+        else:
+            self.__prefetch.record(track)
+
+        self._show_cover(self.lb_curr_cover, str(track.id), track.og_image, self.__covers.SMALL)
+        self.__prefetch.schedule(tracks, idx)
+        self.__yac.track_played(track)
+        self.lbst.setText(f'{self.__prefetch.stats()} | {self.__yac.cache.describe()} | '
+                          f'{self.__yac.clt.request.stats.describe()}'
+                          f'{f" | {self.player.describe()}" if hasattr(self.player, "describe") else ""}')
+        self.lb_curr_title.setText(f'{", ".join(track.artists_name())} - {track.title}')
+        return True
 
     def on_tab_changed(self, ix: int) -> None:
         """
-        Change the playlist when other tab has been selected.
+        Show the last known rows of the selected tab at once and revalidate them in background.
+        The playing list is kept until a track of the tab is chosen.
         :param ix:
         :return:
         """
         self.currtab_idx = ix
         if ix == 0:
-            qmplist = self.qmpl_tracks
-            self._update_playlists()
+            self._revalidate('playlists')
         elif ix == 1:
-            qmplist = self.qmpl_likes
-            self._update_likes()
+            self._revalidate('likes')
+
+    def _step(self, delta: int) -> None:
+        """
+        Play the previous or the next track in the order of the view, so the sorting and the filter are followed.
+        The playlist order is used for the similar tracks and when the current track is filtered out.
+        :param delta: -1 or 1.
+        :return:
+        """
+        qmpl = self.player.playlist()
+        if qmpl is self.qmpl_tracks:
+            view = self.tv_tracks
+        elif qmpl is self.qmpl_likes:
+            view = self.tv_likes
         else:
+            view = None
+
+        row = -1 if view is None else view.model().proxy_row(qmpl.currentIndex())
+        if row < 0:
+            if delta < 0:
+                qmpl.previous()
+            else:
+                qmpl.next()
             return
 
-        self.player.setPlaylist(qmplist)
-        self.bt_prev.pressed.disconnect()
-        self.bt_next.pressed.disconnect()
-        self.bt_prev.pressed.connect(qmplist.previous)
-        self.bt_next.pressed.connect(qmplist.next)
+        row += delta
+        if 0 <= row < view.model().rowCount():
+            qmpl.setCurrentIndex(view.model().source_row(row))
+            self.player.play()
+        elif row >= 0:
+            self.player.stop()
 
     def on_about(self, _) -> None:
         """
@@ -555,5 +1220,5 @@ class YaPlayerWindow(QMainWindow):  # pylint: disable=too-many-instance-attribut
         :return:
         """
         dlg = QDialog(self, Qt.WindowType.Dialog)
-        uic.loadUi(path.join(getcwd(), 'ui/about.ui'), dlg)
+        setup_ui('about', dlg)
         dlg.exec_()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Local snapshot of the library metadata for instant start and offline browsing.
+"""
+import os
+from json import dump, load
+from yandex_music import Album, Artist, Client, Playlist, Track
+
+
+class Library:
+    """
+    Playlists and track lists metadata stored at `<cache>/library/*.json`.
+    Only the fields used by the player are kept, so the snapshot loads in milliseconds.
+    """
+    __slots__ = ('root',)
+
+    def __init__(self, cache_dir: str) -> None:
+        self.root = f'{cache_dir}/library'
+        os.makedirs(self.root, exist_ok=True)
+
+    def save_playlists(self, playlists: list[Playlist]) -> None:
+        """
+        Save the list of playlists.
+        :param playlists:
+        :return:
+        """
+        self._dump('playlists', [[_pl.kind, _pl.title, _pl.revision, _pl.track_count] for _pl in playlists])
+
+    def load_playlists(self, client: Client) -> list[Playlist]:
+        """
+        Load the list of playlists.
+        :param client:
+        :return:
+        """
+        return [Playlist(None, None, None, None, None, kind=kind, title=title, revision=revision,
+                         track_count=track_count, client=client)
+                for kind, title, revision, track_count in self._load('playlists') or []]
+
+    def save_tracks(self, name: str | int, revision: int, tracks: list[Track]) -> None:
+        """
+        Save the track list.
+        :param name: `likes` or playlist kind.
+        :param revision:
+        :param tracks:
+        :return:
+        """
+        self._dump(name, {'revision': revision,
+                          'tracks': [[_tr.id, _tr.title, _tr.duration_ms, _tr.og_image,
+                                      [[_ar.id, _ar.name] for _ar in _tr.artists],
+                                      [[_al.id, _al.title, _al.year] for _al in _tr.albums]] for _tr in tracks]})
+
+    def load_tracks(self, name: str | int, client: Client) -> tuple[int, list[Track]] | None:
+        """
+        Load the track list.
+        :param name: `likes` or playlist kind.
+        :param client:
+        :return: Revision and tracks or None if there is no snapshot.
+        """
+        data = self._load(name)
+        if data is None:
+            return None
+
+        return data['revision'], [
+            Track(id=_id, title=title, duration_ms=duration, og_image=og_image, client=client,
+                  artists=[Artist(id=_ar[0], name=_ar[1], client=client) for _ar in artists],
+                  albums=[Album(id=_al[0], title=_al[1], year=_al[2], client=client) for _al in albums])
+            for _id, title, duration, og_image, artists, albums in data['tracks']]
+
+    def kinds(self) -> list[str]:
+        """
+        Get the names of the saved track lists.
+        :return:
+        """
+        return [fn[:-5] for fn in os.listdir(self.root) if fn.endswith('.json') and fn != 'playlists.json']
+
+    def clear(self) -> None:
+        """
+        Remove the snapshot.
+        :return:
+        """
+        for fn in os.listdir(self.root):
+            os.remove(f'{self.root}/{fn}')
+
+    def _dump(self, name: str | int, data) -> None:
+        _fname = f'{self.root}/{name}.json'
+        with open(f'{_fname}.tmp', 'w', encoding='utf-8') as fh:
+            dump(data, fh, ensure_ascii=False)
+
+        os.replace(f'{_fname}.tmp', _fname)
+
+    def _load(self, name: str | int):
+        try:
+            with open(f'{self.root}/{name}.json', 'r', encoding='utf-8') as fh:
+                return load(fh)
+        except (FileNotFoundError, ValueError):
+            return None
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Chunked loading of the likes collection.
+"""
+from PyQt5.QtCore import QObject, pyqtSignal
+from yandex_music import TrackShort
+
+from workers import JobRunner
+from yaclient import YaClient, Track
+
+
+class LikesLoader(QObject):  # pylint: disable=too-many-instance-attributes
+    """
+    Fetches the tracks of the collection which are not known yet by chunks of ids, a bounded number of chunks
+    is requested in parallel. The first chunk is small, so the first screen of rows comes with one round trip.
+    The chunks are delivered with `chunk` signal in the collection order, `finished` gets the whole collection
+    and its revision or None revision if some chunks failed.
+    """
+    chunk = pyqtSignal(list)
+    finished = pyqtSignal(object, list)
+
+    FIRST_CHUNK = 50
+    CHUNK = 250
+    WORKERS = 4
+
+    def __init__(self, yac: YaClient, parent: QObject=None, workers: int=WORKERS) -> None:
+        super().__init__(parent)
+        self.yac = yac
+        self.revision: int = None
+        self.order: list[str] = []
+        self.known: dict[str, Track] = {}
+        self.failed = 0
+        self.missing = 0
+        self.loaded = 0
+        self._results: dict[int, list[Track]] = {}
+        self._next = 0
+        self._total = 0
+        self._generation = 0
+        self._jobs = JobRunner(self, workers)
+
+    def start(self, revision: int, shorts: list[TrackShort]) -> None:
+        """
+        Load the collection, the previous loading is dropped.
+        :param revision:
+        :param shorts: Tracks of the collection in its order.
+        :return:
+        """
+        self._jobs.cancel_all()
+        self._generation += 1
+        self.revision = revision
+        self.order = [str(_ts.id) for _ts in shorts]
+        self.known = {str(_tr.id): _tr for _tr in self.yac.likes}
+        self.failed = 0
+        self._results = {}
+        self._next = 0
+
+        missing = [_ts.track_id for _ts in shorts if str(_ts.id) not in self.known]
+        chunks = [missing[:LikesLoader.FIRST_CHUNK]] if missing else []
+        chunks.extend(missing[_i:_i + LikesLoader.CHUNK]
+                      for _i in range(LikesLoader.FIRST_CHUNK, len(missing), LikesLoader.CHUNK))
+        self._total = len(chunks)
+        self.missing = len(missing)
+        self.loaded = 0
+        for _i, ids in enumerate(chunks):
+            self._jobs.submit(f'{self._generation}/{_i}', '', self.yac.clt.tracks, ids,
+                              on_done=lambda trs, g=self._generation, i=_i: self._chunk_done(g, i, trs),
+                              on_error=lambda e, g=self._generation, i=_i: self._chunk_failed(g, i, e))
+
+        self._deliver()
+
+    def is_active(self) -> bool:
+        """
+        Check if the loading is not finished.
+        :return:
+        """
+        return self._next < self._total
+
+    def progress(self) -> str:
+        """
+        Get the loading progress description.
+        :return:
+        """
+        return f'Коллекция: {self.loaded}/{self.missing}'
+
+    def cancel(self) -> None:
+        """
+        Drop the loading.
+        :return:
+        """
+        self._jobs.cancel_all()
+        self._generation += 1
+        self._total = self._next = 0
+
+    def _chunk_done(self, generation: int, idx: int, tracks: list[Track]) -> None:
+        if generation == self._generation:
+            self._results[idx] = tracks
+            self._deliver()
+
+    def _chunk_failed(self, generation: int, idx: int, e: Exception) -> None:
+        if generation == self._generation:
+            print('Likes chunk loading failed:', e)
+            self.failed += 1
+            self._results[idx] = []
+            self._deliver()
+
+    def _deliver(self) -> None:
+        """
+        Emit the loaded chunks in order and finish when all of them are loaded.
+        :return:
+        """
+        while self._next in self._results:
+            tracks = self._results.pop(self._next)
+            self.known.update((str(_tr.id), _tr) for _tr in tracks)
+            self.loaded += len(tracks)
+            self._next += 1
+            if tracks:
+                self.chunk.emit(tracks)
+
+        if self._next == self._total:
+            self._total = self._next = 0
+            self.finished.emit(None if self.failed else self.revision,
+                               [self.known[_id] for _id in self.order if _id in self.known])
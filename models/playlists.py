@@ -2,18 +2,28 @@
 """
 Model for the list of playlists.
 """
+from __future__ import annotations
+from difflib import SequenceMatcher
+from typing import TYPE_CHECKING, Callable
 from PyQt5.QtCore import QAbstractListModel, Qt, QModelIndex
+from PyQt5.QtGui import QPixmap
 from PyQt5.QtWidgets import QWidget
-from yandex_music import Playlist
+
+if TYPE_CHECKING:
+    from yandex_music import Playlist
 
 
 class PlaylistsModel(QAbstractListModel):
     """
     Model implementation for the list of playlists.
+    The row is title, kind, revision, track count and cover URL template of the playlist.
+    `update_data` changes only the rows of the added, removed and changed playlists, so the selection is kept.
     """
     def __init__(self, parent: QWidget=None) -> None:
         super().__init__(parent)
-        self.rows: list[tuple[str, str, int]] = []
+        self.rows: list[tuple[str, int | str, int, int, str | None]] = []
+        # Cover thumbnail getter: cover key and URL template, None while the cover is loading
+        self.covers: Callable[[str, str | None], QPixmap | None] = None
 
     def data(self, index: QModelIndex, role: int=None):
         """
@@ -22,8 +32,11 @@ class PlaylistsModel(QAbstractListModel):
         :param role:
         :return:
         """
+        row = self.rows[index.row()]
         if role == Qt.DisplayRole:
-            return self.rows[index.row()][0]
+            return f'{row[0]} ({row[3]})'
+        if role == Qt.DecorationRole and self.covers is not None and row[4]:
+            return self.covers(PlaylistsModel.cover_key(row[1]), row[4])  # pylint: disable=not-callable
 
         return None
 
@@ -34,15 +47,80 @@ class PlaylistsModel(QAbstractListModel):
         """
         return len(self.rows)
 
+    @staticmethod
+    def cover_key(kind: int | str) -> str:
+        """
+        Get the key of the playlist cover at the cover store.
+        :param kind:
+        :return:
+        """
+        return f'playlist-{kind}'
+
+    @staticmethod
+    def make_row(playlist: Playlist) -> tuple[str, int | str, int, int, str | None]:
+        """
+        Get the row of the playlist.
+        :param playlist:
+        :return:
+        """
+        cover = playlist.og_image or (playlist.cover.uri if playlist.cover is not None else None)
+        return playlist.title, playlist.kind, playlist.revision, playlist.track_count or 0, cover
+
     def update_data(self, data: list[Playlist]) -> None:
         """
-        Fully update the underlying data.
+        Update the underlying data, the playlists are matched by kind.
         :param data:
         :return:
         """
-        self.rows.clear()
-        self.beginResetModel()
-        for _pl in data:
-            self.rows.append((_pl.title, _pl.kind, _pl.revision))
+        rows = [PlaylistsModel.make_row(_pl) for _pl in data]
+        matcher = SequenceMatcher(None, [_r[1] for _r in self.rows], [_r[1] for _r in rows], autojunk=False)
+        for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+            if tag == 'equal':
+                for _i, _j in zip(range(i1, i2), range(j1, j2)):
+                    if self.rows[_i] != rows[_j]:
+                        self.rows[_i] = rows[_j]
+                        self.dataChanged.emit(self.index(_i), self.index(_i))
+                continue
+            if i2 > i1:
+                self.beginRemoveRows(QModelIndex(), i1, i2 - 1)
+                del self.rows[i1:i2]
+                self.endRemoveRows()
+            if j2 > j1:
+                self.beginInsertRows(QModelIndex(), i1, i1 + j2 - j1 - 1)
+                self.rows[i1:i1] = rows[j1:j2]
+                self.endInsertRows()
+
+    def row_of(self, kind: int | str) -> int:
+        """
+        Find the row of the playlist.
+        :param kind:
+        :return: -1 if there is no such playlist.
+        """
+        return next((_i for _i, _pl in enumerate(self.rows) if _pl[1] == kind), -1)
+
+    def set_revision(self, kind: int | str, revision: int, track_count: int=None) -> None:
+        """
+        Update the revision and the track count of the playlist.
+        :param kind:
+        :param revision:
+        :param track_count:
+        :return:
+        """
+        _i = self.row_of(kind)
+        if _i < 0:
+            return
+
+        _pl = self.rows[_i]
+        self.rows[_i] = (_pl[0], _pl[1], revision, _pl[3] if track_count is None else track_count, _pl[4])
+        if self.rows[_i][3] != _pl[3]:
+            self.dataChanged.emit(self.index(_i), self.index(_i))
 
-        self.endResetModel()
+    def cover_loaded(self, key: str) -> None:
+        """
+        Repaint the row of the playlist when its cover is loaded.
+        :param key:
+        :return:
+        """
+        for _i, _pl in enumerate(self.rows):
+            if PlaylistsModel.cover_key(_pl[1]) == key:
+                self.dataChanged.emit(self.index(_i), self.index(_i), [Qt.DecorationRole])
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Sorting and filtering proxy of the track list model.
+"""
+from bisect import bisect_left
+from PyQt5.QtCore import QAbstractProxyModel, QModelIndex, QObject, Qt
+
+from models.tracks import TracksModel, normalize
+
+
+class TracksProxy(QAbstractProxyModel):
+    """
+    The view rows are mapped to the source rows with python lists built from the precomputed sort keys
+    and search text of the rows. Unlike QSortFilterProxyModel there is no virtual call per row,
+    so a filter keystroke over tens of thousands of rows takes a few milliseconds.
+    The filter terms must all be found at the artists, title or album of the row.
+    """
+    def __init__(self, parent: QObject=None) -> None:
+        super().__init__(parent)
+        self.terms: list[str] = []
+        self.sort_column = -1
+        self.sort_order = Qt.SortOrder.AscendingOrder
+        self._order: list[int] = []
+        self._rows: list[int] = []
+        self._inverse: list[int] = None
+
+    def setSourceModel(self, model: TracksModel) -> None:  # pylint: disable=invalid-name
+        """
+        Set the source model and follow its changes.
+        :param model:
+        :return:
+        """
+        super().setSourceModel(model)
+        model.modelAboutToBeReset.connect(self.beginResetModel)
+        model.modelReset.connect(self._source_reset)
+        model.rowsInserted.connect(self._source_inserted)
+        model.rowsAboutToBeRemoved.connect(self._source_removing)
+        model.dataChanged.connect(self._source_changed)
+        self.beginResetModel()
+        self._source_reset()
+
+    def rowCount(self, parent: QModelIndex=QModelIndex()) -> int:  # pylint: disable=invalid-name
+        """
+        Get the number of the visible rows.
+        :param parent:
+        :return:
+        """
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent: QModelIndex=QModelIndex()) -> int:  # pylint: disable=invalid-name
+        """
+        Get the number of columns.
+        :param parent:
+        :return:
+        """
+        return 0 if parent.isValid() else self.sourceModel().columnCount()
+
+    def index(self, row: int, column: int, parent: QModelIndex=QModelIndex()) -> QModelIndex:
+        """
+        Get the index of the cell.
+        :param row:
+        :param column:
+        :param parent:
+        :return:
+        """
+        if parent.isValid() or not 0 <= row < len(self._rows) or not 0 <= column < self.columnCount():
+            return QModelIndex()
+
+        return self.createIndex(row, column)
+
+    def parent(self, child: QModelIndex=None):
+        """
+        The rows have no parent, QObject parent is returned if called without the index.
+        :param child:
+        :return:
+        """
+        return QObject.parent(self) if child is None else QModelIndex()
+
+    def hasChildren(self, parent: QModelIndex=QModelIndex()) -> bool:  # pylint: disable=invalid-name
+        """
+        Only the root has children.
+        :param parent:
+        :return:
+        """
+        return not parent.isValid() and bool(self._rows)
+
+    def mapToSource(self, index: QModelIndex) -> QModelIndex:  # pylint: disable=invalid-name
+        """
+        Map the view index to the source model index.
+        :param index:
+        :return:
+        """
+        if not index.isValid():
+            return QModelIndex()
+
+        return self.sourceModel().index(self._rows[index.row()], index.column())
+
+    def mapFromSource(self, index: QModelIndex) -> QModelIndex:  # pylint: disable=invalid-name
+        """
+        Map the source model index to the view index, the index is invalid if the row is filtered out.
+        :param index:
+        :return:
+        """
+        row = self.proxy_row(index.row()) if index.isValid() else -1
+        return QModelIndex() if row < 0 else self.createIndex(row, index.column())
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int=None):  # pylint: disable=invalid-name
+        """
+        Get the column titles of the source model.
+        :param section:
+        :param orientation:
+        :param role:
+        :return:
+        """
+        return self.sourceModel().headerData(section, orientation, role)
+
+    def source_row(self, row: int) -> int:
+        """
+        Get the source row of the view row.
+        :param row:
+        :return:
+        """
+        return self._rows[row]
+
+    def proxy_row(self, row: int) -> int:
+        """
+        Get the view row of the source row.
+        :param row:
+        :return: -1 if the row is filtered out.
+        """
+        if self._inverse is None:
+            self._inverse = [-1] * self.sourceModel().rowCount()
+            for _p, _r in enumerate(self._rows):
+                self._inverse[_r] = _p
+
+        return self._inverse[row] if 0 <= row < len(self._inverse) else -1
+
+    def sort(self, column: int, order: Qt.SortOrder=Qt.SortOrder.AscendingOrder) -> None:
+        """
+        Sort the rows, the selection and the persistent editors are kept. No sort column keeps the source order.
+        :param column:
+        :param order:
+        :return:
+        """
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        sources = [(self._rows[_idx.row()], _idx.column()) for _idx in persistent]
+        self.sort_column = column if 0 <= column < len(TracksModel.COLUMNS) else -1
+        self.sort_order = order
+        self._build_order()
+        self._rows = self._match(self._order)
+        self._inverse = None
+        self.changePersistentIndexList(persistent, [self.index(self.proxy_row(_r), _c) for _r, _c in sources])
+        self.layoutChanged.emit()
+
+    def set_filter(self, text: str) -> None:
+        """
+        Show only the rows containing all words of the text. If the text is narrowed while typing,
+        only the rows shown already are checked.
+        :param text:
+        :return:
+        """
+        terms = normalize(text).split()
+        if terms == self.terms:
+            return
+
+        narrowed = bool(self.terms) and len(terms) >= len(self.terms) and \
+            all(_old in _new for _old, _new in zip(self.terms, terms))
+        self.beginResetModel()
+        self.terms = terms
+        self._rows = self._match(self._rows if narrowed else self._order)
+        self._inverse = None
+        self.endResetModel()
+
+    def _build_order(self) -> None:
+        rows = self.sourceModel().rows
+        if self.sort_column < 0:
+            self._order = list(range(len(rows)))
+            return
+
+        keys = [_row.sort_key(self.sort_column) for _row in rows]
+        self._order = sorted(range(len(rows)), key=keys.__getitem__,
+                             reverse=self.sort_order == Qt.SortOrder.DescendingOrder)
+
+    def _match(self, candidates: list[int]) -> list[int]:
+        rows = self.sourceModel().rows
+        for term in self.terms:
+            candidates = [_r for _r in candidates if term in rows[_r].search]
+
+        return list(candidates)
+
+    def _source_reset(self) -> None:
+        self._build_order()
+        self._rows = self._match(self._order)
+        self._inverse = None
+        self.endResetModel()
+
+    def _source_inserted(self, _: QModelIndex, first: int, last: int) -> None:
+        if self.sort_column >= 0:
+            # The new rows are scattered over the sorted rows
+            self.beginResetModel()
+            self._source_reset()
+            return
+
+        cnt = last - first + 1
+        self._order = [_r + cnt if _r >= first else _r for _r in self._order]
+        self._order[first:first] = range(first, last + 1)
+        self._rows = [_r + cnt if _r >= first else _r for _r in self._rows]
+        self._inverse = None
+        added = self._match(list(range(first, last + 1)))
+        if added:
+            pos = bisect_left(self._rows, first)
+            self.beginInsertRows(QModelIndex(), pos, pos + len(added) - 1)
+            self._rows[pos:pos] = added
+            self.endInsertRows()
+
+    def _source_removing(self, _: QModelIndex, first: int, last: int) -> None:
+        removed = [_p for _p, _r in enumerate(self._rows) if first <= _r <= last]
+        # Contiguous runs of the view rows are removed from the end
+        while removed:
+            end = start = removed.pop()
+            while removed and removed[-1] == start - 1:
+                start = removed.pop()
+
+            self.beginRemoveRows(QModelIndex(), start, end)
+            del self._rows[start:end + 1]
+            self.endRemoveRows()
+
+        cnt = last - first + 1
+        self._order = [_r - cnt if _r > last else _r for _r in self._order if not first <= _r <= last]
+        self._rows = [_r - cnt if _r > last else _r for _r in self._rows]
+        self._inverse = None
+
+    def _source_changed(self, top_left: QModelIndex, bottom_right: QModelIndex, roles: list[int]=()) -> None:
+        rows = [_p for _p in map(self.proxy_row, range(top_left.row(), bottom_right.row() + 1)) if _p >= 0]
+        if rows:
+            self.dataChanged.emit(self.index(min(rows), top_left.column()),
+                                  self.index(max(rows), bottom_right.column()), roles)
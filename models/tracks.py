@@ -2,30 +2,111 @@
 """
 Track list model.
 """
+from __future__ import annotations
+import unicodedata
 from functools import lru_cache
+from typing import TYPE_CHECKING, Callable
 from PyQt5.QtCore import QModelIndex
 from PyQt5.QtCore import QAbstractTableModel, Qt
-from PyQt5.QtMultimedia import QMediaPlaylist
+from PyQt5.QtGui import QPixmap
+
+if TYPE_CHECKING:
+    from PyQt5.QtMultimedia import QMediaContent, QMediaPlaylist
+    from yandex_music import Track
+
+
+@lru_cache(maxsize=None)
+def _fold_char(char: str) -> str:
+    if char == 'й':
+        return char
+
+    return ''.join(_c for _c in unicodedata.normalize('NFKD', char) if not unicodedata.combining(_c))
+
+
+def normalize(text: str) -> str:
+    """
+    Normalize the text for the search: case, diacritics and ё are ignored.
+    :param text:
+    :return:
+    """
+    text = text.casefold().replace('ё', 'е')
+    return text if text.isascii() else ''.join(map(_fold_char, text))
+
+
+class TrackRow:  # pylint: disable=too-many-instance-attributes
+    """
+    Precomputed display data of the track.
+    """
+    __slots__ = ('track_id', 'artists', 'title', 'album', 'duration', 'length', 'liked', 'cover', 'search')
+
+    CELLS = ('artists', 'title', 'album', 'length')
+
+    def __init__(self, track: Track, liked: bool=False) -> None:
+        self.track_id = str(track.id)
+        self.artists = ', '.join(track.artists_name())
+        self.title = track.title or ''
+        self.album = f'{track.albums[0].title} [{track.albums[0].year}]' if track.albums else ''
+        self.duration = track.duration_ms or 0
+        self.length = f'{self.duration//60000}:{self.duration%60000//1000:02d}'
+        self.liked = liked
+        self.cover: str | None = track.og_image
+        self.search = normalize(f'{self.artists}\n{self.title}\n{self.album}')
+
+    def display(self, column: int) -> str:
+        """
+        Get the text of the column.
+        :param column:
+        :return:
+        """
+        if column == 4:
+            return '♥' if self.liked else ''
+
+        return getattr(self, TrackRow.CELLS[column])
+
+    def sort_key(self, column: int) -> str | int:
+        """
+        Get the sort key of the column.
+        :param column:
+        :return:
+        """
+        if column == 3:
+            return self.duration
+        if column == 4:
+            return int(self.liked)
+
+        return self.display(column).casefold()
 
 
 class TracksModel(QAbstractTableModel):
     """
     Track list model implementation.
+    The rows are kept in the same order as the media of the playlist.
     """
     commonFlags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
     buttonFlags = commonFlags | Qt.ItemFlag.ItemIsEditable
 
-    def __init__(self, playlist: QMediaPlaylist, column_count: int, *args, **kwargs):
+    COLUMNS = ('Исполнитель', 'Название', 'Альбом', 'Время', '♥')
+    SORT_ROLE = Qt.ItemDataRole.UserRole
+    LIKED_ROLE = Qt.ItemDataRole.UserRole + 1
+    LIKED_COLUMN = 4
+
+    def __init__(self, playlist: QMediaPlaylist, buttons: int, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.playlist = playlist
-        self.col_cnt = column_count
+        self.buttons = buttons
+        self.col_cnt = len(TracksModel.COLUMNS) + buttons
+        self.rows: list[TrackRow] = []
+        # Rows by track id, rebuilt on demand after the rows are inserted or removed
+        self._rows_of: dict[str, list[int]] | None = None
+        # Cover thumbnail of the row by track id and cover URL, None until it is loaded
+        self.covers: Callable[[str, str | None], QPixmap | None] = None
 
     def rowCount(self, _: QModelIndex=None) -> int: # pylint: disable=invalid-name
         """
         Get the number of rows.
         :return:
         """
-        return self.playlist.mediaCount()
+        return len(self.rows)
 
     @lru_cache(10)
     def columnCount(self, _: QModelIndex=None) -> int: # pylint: disable=invalid-name
@@ -43,10 +124,42 @@ class TracksModel(QAbstractTableModel):
         :param role:
         :return:
         """
-        if not index.isValid() or role != 0 or index.column() != 0:
+        column = index.column()
+        if column >= len(TracksModel.COLUMNS):
             return None
 
-        return self.playlist.media(index.row()).canonicalUrl().fileName().rsplit('.', 1)[0]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.rows[index.row()].display(column)
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self._cover(index) if column == 0 else None
+        if role == TracksModel.SORT_ROLE:
+            return self.rows[index.row()].sort_key(column)
+        if role == TracksModel.LIKED_ROLE:
+            return self.rows[index.row()].liked
+
+        return None
+
+    def _cover(self, index: QModelIndex) -> QPixmap | None:
+        covers = self.covers
+        if covers is None:
+            return None
+
+        row = self.rows[index.row()]
+        return covers(row.track_id, row.cover)  # pylint: disable=not-callable
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int=None): # pylint: disable=invalid-name
+        """
+        Get the column titles.
+        :param section:
+        :param orientation:
+        :param role:
+        :return:
+        """
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole \
+                and section < len(TracksModel.COLUMNS):
+            return TracksModel.COLUMNS[section]
+
+        return None
 
     def flags(self, index: QModelIndex) -> Qt.ItemFlag:
         """
@@ -54,4 +167,85 @@ class TracksModel(QAbstractTableModel):
         :param index:
         :return:
         """
-        return TracksModel.commonFlags if index.column() == 0 else TracksModel.buttonFlags
+        return TracksModel.commonFlags if index.column() < len(TracksModel.COLUMNS) else TracksModel.buttonFlags
+
+    def set_tracks(self, tracks: list[Track], media: list[QMediaContent], liked: set[str]=frozenset()) -> None:
+        """
+        Replace all rows and the playlist media.
+        :param tracks:
+        :param media:
+        :param liked: Ids of the liked tracks.
+        :return:
+        """
+        self.beginResetModel()
+        self.playlist.clear()
+        self.playlist.addMedia(media)
+        self.rows = [TrackRow(_tr, str(_tr.id) in liked) for _tr in tracks]
+        self._rows_of = None
+        self.endResetModel()
+
+    def insert_rows(self, first: int, tracks: list[Track], media: list[QMediaContent],
+                    liked: set[str]=frozenset()) -> None:
+        """
+        Insert the tracks and the media into the playlist with the rows insertion notification.
+        :param first:
+        :param tracks:
+        :param media:
+        :param liked: Ids of the liked tracks.
+        :return:
+        """
+        self.beginInsertRows(QModelIndex(), first, first + len(media) - 1)
+        self.playlist.insertMedia(first, media)
+        self.rows[first:first] = [TrackRow(_tr, str(_tr.id) in liked) for _tr in tracks]
+        self._rows_of = None
+        self.endInsertRows()
+
+    def cover_loaded(self, track_id: str) -> None:
+        """
+        Repaint the rows of the track when its cover is loaded.
+        :param track_id:
+        :return:
+        """
+        if self._rows_of is None:
+            self._rows_of = {}
+            for _i, row in enumerate(self.rows):
+                self._rows_of.setdefault(row.track_id, []).append(_i)
+
+        for _i in self._rows_of.get(track_id, ()):
+            self.dataChanged.emit(self.index(_i, 0), self.index(_i, 0), [Qt.ItemDataRole.DecorationRole])
+
+    def is_liked(self, row: int) -> bool:
+        """
+        Get the like state of the row.
+        :param row:
+        :return:
+        """
+        return self.rows[row].liked
+
+    def set_liked(self, track_ids: set[str], liked: bool) -> None:
+        """
+        Update the like state of the rows of the tracks.
+        :param track_ids:
+        :param liked:
+        :return:
+        """
+        changed = [_i for _i, row in enumerate(self.rows) if row.liked != liked and row.track_id in track_ids]
+        for _i in changed:
+            self.rows[_i].liked = liked
+
+        if changed:
+            self.dataChanged.emit(self.index(changed[0], TracksModel.LIKED_COLUMN),
+                                  self.index(changed[-1], TracksModel.LIKED_COLUMN))
+
+    def remove_rows(self, first: int, last: int) -> None:
+        """
+        Remove the media from the playlist with the rows removal notification.
+        :param first:
+        :param last:
+        :return:
+        """
+        self.beginRemoveRows(QModelIndex(), first, last)
+        self.playlist.removeMedia(first, last)
+        del self.rows[first:last + 1]
+        self._rows_of = None
+        self.endRemoveRows()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Offline sync of whole track lists.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import monotonic
+from typing import Callable
+from yandex_music.exceptions import YandexMusicError
+
+from yaclient import YaClient, Track
+
+
+class OfflineSync:  # pylint: disable=too-many-instance-attributes
+    """
+    Downloads tracks and covers of the lists with a bounded pool of workers.
+    The queue is kept at the cache index, so the sync resumes after restart.
+    A track is queued once by the run, the run ends when all its tracks are done.
+    """
+    __slots__ = ('yac', 'download', 'total', 'done', 'skipped', 'failed', 'error', 'bytes', 'started', 'queued',
+                 '_pool', '_lock')
+
+    WORKERS = 4
+
+    def __init__(self, yac: YaClient, workers: int=WORKERS, download: Callable[[Track], None]=None) -> None:
+        self.yac = yac
+        self.download = download or yac.download_track
+        self.total = 0
+        self.done = 0
+        self.skipped = 0
+        self.failed = 0
+        # Last download error for the progress report
+        self.error = ''
+        self.bytes = 0
+        self.started = 0.0
+        # Ids of the tracks queued by the current run
+        self.queued: set[str] = set()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='offline')
+        self._lock = Lock()
+
+    def sync(self, name: str, tracks: list[Track]) -> None:
+        """
+        Queue all tracks of the list for download.
+        :param name: List name, kept at the queue for the progress report.
+        :param tracks:
+        :return:
+        """
+        self.yac.cache.queue_add(name, [str(_tr.id) for _tr in tracks if not self.yac.is_cached(_tr)])
+        self._submit(tracks)
+
+    def resume(self) -> int:
+        """
+        Queue the tracks left from the previous run and the damaged cached tracks, fetches them from the server.
+        :return: Number of queued tracks.
+        """
+        self.yac.scrub_cache()
+        ids = self.yac.cache.queue_pending()
+        if ids:
+            self._submit(self.yac.clt.tracks(ids))
+
+        return len(ids)
+
+    def is_active(self) -> bool:
+        """
+        Check if there are tracks left to download.
+        :return:
+        """
+        return self.done + self.skipped + self.failed < self.total
+
+    def progress(self) -> str:
+        """
+        Get the aggregate progress description.
+        :return:
+        """
+        elapsed = max(monotonic() - self.started, 1e-3)
+        return (f'Офлайн: {self.done + self.skipped}/{self.total}, {self.bytes / elapsed / 1048576:.1f} MB/s'
+                f'{f", ошибок {self.failed}: {self.error}" if self.failed else ""}')
+
+    def shutdown(self) -> None:
+        """
+        Cancel queued downloads, they are resumed at the next start.
+        :return:
+        """
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, tracks: list[Track]) -> None:
+        fresh = []
+        with self._lock:
+            if not self.is_active():
+                self.total = self.done = self.skipped = self.failed = self.bytes = 0
+                self.error = ''
+                self.started = monotonic()
+                self.queued.clear()
+
+            # Two workers of the same track would write the same cache file
+            for _tr in tracks:
+                if str(_tr.id) not in self.queued:
+                    self.queued.add(str(_tr.id))
+                    fresh.append(_tr)
+            self.total += len(fresh)
+
+        for _tr in fresh:
+            self._pool.submit(self._download, _tr)
+
+    def _download(self, track: Track) -> None:
+        cached = self.yac.is_cached(track)
+        try:
+            self.yac.download_cover(track)
+            if not cached:
+                self.download(track)
+        except (YandexMusicError, OSError) as e:
+            with self._lock:
+                self.failed += 1
+                self.error = f'{track.title}: {e}'
+            return
+
+        with self._lock:
+            if cached:
+                self.skipped += 1
+            else:
+                self.done += 1
+                self.bytes += os.path.getsize(self.yac.track_path(track))
+
+        self.yac.cache.queue_remove(str(track.id))
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Gapless playback of QMediaPlaylist with the next track preloaded by the second player.
+"""
+from collections import deque
+from time import perf_counter
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.QtMultimedia import QMediaContent, QMediaPlayer, QMediaPlaylist
+
+from tracing import TRACER
+
+
+class GaplessPlayer(QObject):  # pylint: disable=too-many-instance-attributes
+    """
+    Drop-in for the QMediaPlayer methods the window uses. The playlist is played by two players: the active one
+    plays the current track, the standby one keeps the next track opened and paused, so at the end of the track
+    it only has to start, optionally with the crossfade. The delay between the end of the track and the buffered
+    next one is kept as the transition latency.
+    """
+    error = pyqtSignal(int)
+    durationChanged = pyqtSignal('qint64')  # pylint: disable=invalid-name
+    positionChanged = pyqtSignal('qint64')  # pylint: disable=invalid-name
+
+    NOTIFY_MS = 200
+    FADE_TICK_MS = 50
+    # The preload of the track which wasn't downloaded yet is retried before the end
+    RETRY_MS = 15000
+    TARGET_MS = 50
+    WINDOW = 64
+
+    def __init__(self, parent: QObject=None, crossfade_ms: int=0) -> None:
+        super().__init__(parent)
+        self.crossfade_ms = crossfade_ms
+        self.latencies: deque[float] = deque(maxlen=GaplessPlayer.WINDOW)
+        self._players = (QMediaPlayer(self), QMediaPlayer(self))
+        self._active = 0
+        self._playlist: QMediaPlaylist = None
+        self._volume = 100
+        self._switching = False
+        self._load_pending = False
+        # Player and start time of the transition waiting for the buffered media
+        self._waiting: tuple[QMediaPlayer, float] = None
+        self._fade_start: float = None
+        self._fade = QTimer(self)
+        self._fade.setInterval(GaplessPlayer.FADE_TICK_MS)
+        self._fade.timeout.connect(self._fade_step)
+        for _pl in self._players:
+            _pl.setNotifyInterval(GaplessPlayer.NOTIFY_MS)
+            _pl.error.connect(lambda err, p=_pl: p is self.active and self.error.emit(err))
+            _pl.durationChanged.connect(lambda ms, p=_pl: p is self.active and self.durationChanged.emit(ms))
+            _pl.positionChanged.connect(lambda ms, p=_pl: p is self.active and self._position(ms))
+            _pl.mediaStatusChanged.connect(lambda st, p=_pl: self._status(p, st))
+
+    @property
+    def active(self) -> QMediaPlayer:
+        """
+        Player of the current track.
+        :return:
+        """
+        return self._players[self._active]
+
+    @property
+    def standby(self) -> QMediaPlayer:
+        """
+        Player of the next track.
+        :return:
+        """
+        return self._players[1 - self._active]
+
+    def playlist(self) -> QMediaPlaylist:
+        """
+        Get the playing list.
+        :return:
+        """
+        return self._playlist
+
+    def setPlaylist(self, playlist: QMediaPlaylist) -> None:  # pylint: disable=invalid-name
+        """
+        Play other list, the playback is stopped like QMediaPlayer does.
+        :param playlist:
+        :return:
+        """
+        if self._playlist is not None:
+            self._playlist.currentIndexChanged.disconnect(self._index_changed)
+
+        self.stop()
+        self._playlist = playlist
+        playlist.currentIndexChanged.connect(self._index_changed)
+        self._index_changed(playlist.currentIndex())
+
+    def state(self) -> int:
+        """
+        Get the playback state of the current track.
+        :return:
+        """
+        return self.active.state()
+
+    def play(self) -> None:
+        """
+        Play the current track of the list.
+        :return:
+        """
+        self._load_current()
+        self.active.play()
+
+    def pause(self) -> None:
+        """
+        Pause the playback.
+        :return:
+        """
+        self._finish_fade()
+        self.active.pause()
+
+    def stop(self) -> None:
+        """
+        Stop the playback.
+        :return:
+        """
+        self._finish_fade()
+        self.active.stop()
+
+    def setVolume(self, volume: int) -> None:  # pylint: disable=invalid-name
+        """
+        Set the volume of both players.
+        :param volume:
+        :return:
+        """
+        self._volume = volume
+        if self._fade_start is None:
+            for _pl in self._players:
+                _pl.setVolume(volume)
+
+    def setPosition(self, position: int) -> None:  # pylint: disable=invalid-name
+        """
+        Seek the current track.
+        :param position: Milliseconds.
+        :return:
+        """
+        self.active.setPosition(position)
+
+    def describe(self) -> str:
+        """
+        Get the transition latency description for the status bar.
+        :return:
+        """
+        if not self.latencies:
+            return 'Переходы: -'
+
+        latencies = sorted(self.latencies)
+        slow = sum(_l > GaplessPlayer.TARGET_MS for _l in latencies)
+        return (f'Переходы: p50 {latencies[len(latencies) // 2]:.0f} ms, max {latencies[-1]:.0f} ms'
+                f'{f", {slow} > {GaplessPlayer.TARGET_MS} ms" if slow else ""}')
+
+    def _index_changed(self, _: int) -> None:
+        if self._switching:
+            return
+
+        # The window makes the track playable by the same signal, so the media is loaded after it
+        self._load_pending = True
+        QTimer.singleShot(0, self._load_current)
+
+    def _load_current(self) -> None:
+        if not self._load_pending:
+            return
+
+        self._load_pending = False
+        self._finish_fade()
+        playing = self.active.state() == QMediaPlayer.PlayingState
+        media = self._playlist.currentMedia() if self._playlist is not None else QMediaContent()
+        if not media.isNull() and self._same(self.standby, media):
+            # The preloaded track is selected
+            self.active.stop()
+            self._active = 1 - self._active
+        elif not self._same(self.active, media):
+            self.active.setMedia(media)
+
+        if playing:
+            self.active.play()
+        self.durationChanged.emit(self.active.duration())
+        self._preload()
+
+    def _preload(self) -> None:
+        nxt = self._playlist.nextIndex() if self._playlist is not None else -1
+        media = self._playlist.media(nxt) if nxt >= 0 else QMediaContent()
+        if not self._same(self.standby, media) or self.standby.mediaStatus() == QMediaPlayer.InvalidMedia:
+            self.standby.setMedia(media)
+            if not media.isNull():
+                # Paused player opens and buffers the media without playing it
+                self.standby.pause()
+
+    def _position(self, ms: int) -> None:
+        self.positionChanged.emit(ms)
+        left = self.active.duration() - ms
+        if self.active.duration() <= 0 or self._fade_start is not None or self._switching:
+            return
+
+        if 0 < left <= self.crossfade_ms and self._playlist.nextIndex() >= 0:
+            self._advance(fade=True)
+        elif left <= GaplessPlayer.RETRY_MS and self.standby.mediaStatus() in (QMediaPlayer.InvalidMedia,
+                                                                                QMediaPlayer.NoMedia):
+            self._preload()
+
+    def _status(self, player: QMediaPlayer, status: int) -> None:
+        if player is self.active and status == QMediaPlayer.EndOfMedia:
+            self._advance(fade=False)
+        elif self._waiting is not None and player is self._waiting[0] and status == QMediaPlayer.BufferedMedia:
+            self._record(self._waiting[1])
+            self._waiting = None
+
+    def _advance(self, fade: bool) -> None:
+        """
+        Start the next track of the list at the standby player.
+        :param fade: Crossfade with the current track, otherwise it has ended.
+        :return:
+        """
+        nxt = self._playlist.nextIndex()
+        if nxt < 0:
+            self._switching = True
+            self._playlist.setCurrentIndex(nxt)
+            self._switching = False
+            return
+
+        start = perf_counter()
+        incoming = self.standby
+        media = self._playlist.media(nxt)
+        if not self._same(incoming, media) or incoming.mediaStatus() == QMediaPlayer.InvalidMedia:
+            incoming.setMedia(media)
+        incoming.setVolume(0 if fade else self._volume)
+        incoming.play()
+        if incoming.mediaStatus() == QMediaPlayer.BufferedMedia:
+            self._record(start)
+        else:
+            self._waiting = (incoming, start)
+
+        self._active = 1 - self._active
+        if fade:
+            self._fade_start = perf_counter()
+            self._fade.start()
+        else:
+            self.standby.stop()
+
+        self._switching = True
+        self._playlist.setCurrentIndex(nxt)
+        self._switching = False
+        self.durationChanged.emit(incoming.duration())
+        if not fade:
+            self._preload()
+
+    def _fade_step(self) -> None:
+        done = min(1.0, (perf_counter() - self._fade_start) * 1000 / max(self.crossfade_ms, 1))
+        self.active.setVolume(round(self._volume * done))
+        self.standby.setVolume(round(self._volume * (1 - done)))
+        if done >= 1:
+            self._finish_fade()
+
+    def _finish_fade(self) -> None:
+        if self._fade_start is None:
+            return
+
+        self._fade.stop()
+        self._fade_start = None
+        self.standby.stop()
+        self.setVolume(self._volume)
+        self._preload()
+
+    def _record(self, start: float) -> None:
+        end = perf_counter()
+        self.latencies.append((end - start) * 1000)
+        if TRACER.enabled:
+            TRACER.record('transition', 'player', start, end)
+
+    @staticmethod
+    def _same(player: QMediaPlayer, media: QMediaContent) -> bool:
+        return player.media().canonicalUrl() == media.canonicalUrl()
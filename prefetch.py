@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Lookahead prefetch of the upcoming tracks.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+from yandex_music.exceptions import YandexMusicError
+
+from yaclient import YaClient, Track
+
+
+class TrackPrefetcher:  # pylint: disable=too-many-instance-attributes
+    """
+    Downloads the next tracks of the active playlist in the background.
+    """
+    __slots__ = ('yac', 'depth', 'download', 'hits', 'misses', 'errors', '_pool', '_pending')
+
+    DEPTH = 3
+    WORKERS = 2
+
+    def __init__(self, yac: YaClient, depth: int=DEPTH, workers: int=WORKERS,
+                 download: Callable[[Track], None]=None) -> None:
+        self.yac = yac
+        self.depth = depth
+        self.download = download or yac.download_track
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='prefetch')
+        self._pending: dict[str, Future] = {}
+
+    def schedule(self, tracks: list[Track], idx: int) -> None:
+        """
+        Queue the download of `depth` tracks following the index,
+        cancel the queued downloads which are out of the new window.
+        :param tracks:
+        :param idx:
+        :return:
+        """
+        window = {str(_tr.id): _tr for _tr in tracks[idx + 1:idx + 1 + self.depth]}
+        for _tid, _fut in list(self._pending.items()):
+            if _tid not in window:
+                _fut.cancel()
+
+        for _tid, _tr in window.items():
+            if _tid in self._pending or self.yac.is_cached(_tr):
+                continue
+
+            _fut = self._pool.submit(self._download, _tr)
+            self._pending[_tid] = _fut
+            _fut.add_done_callback(lambda f, tid=_tid: self._done(tid, f))
+
+    def record(self, track: Track) -> bool:
+        """
+        Count the cache hit or miss for the track which is about to play.
+        :param track:
+        :return: True on hit.
+        """
+        if self.yac.is_cached(track):
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        return False
+
+    def fetch(self, track: Track) -> None:
+        """
+        Make the track available for playback and count the cache hit or miss.
+        Waits for the download already started by the prefetcher instead of starting a new one.
+        :param track:
+        :return:
+        """
+        if self.record(track):
+            return
+
+        _fut = self._pending.get(str(track.id))
+        if _fut is not None and not _fut.cancel():
+            _fut.result()
+
+        if not self.yac.is_cached(track):
+            self.download(track)
+
+    def stats(self) -> str:
+        """
+        Get the hit/miss rate description.
+        :return:
+        """
+        total = self.hits + self.misses
+        rate = 100 * self.hits // total if total else 0
+        return f'Cache: {self.hits} hits / {self.misses} misses ({rate}%)'
+
+    def shutdown(self) -> None:
+        """
+        Cancel all queued downloads and stop the workers.
+        :return:
+        """
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pending.clear()
+
+    def _download(self, track: Track) -> None:
+        try:
+            self.download(track)
+        except (YandexMusicError, OSError) as e:
+            self.errors += 1
+            print('Prefetch failed:', track.title, e)
+
+    def _done(self, track_id: str, fut: Future) -> None:
+        if self._pending.get(track_id) is fut:
+            self._pending.pop(track_id, None)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Codec and bitrate selection of the track downloads.
+"""
+
+
+class QualityPolicy:
+    """
+    Chooses the best quality which is downloaded `headroom` times faster than it plays at the measured
+    throughput, so the playback starts quickly on a slow link. The preferred codec is lowered in bitrate first,
+    then the fallback codec is tried. Without the measurement the best quality is chosen.
+    The cached tracks of lower quality are downloaded again by `YaClient.upgrade_cache` when the link is idle.
+    """
+    __slots__ = ('codec', 'fallback', 'max_bitrate', 'headroom', 'upgrade')
+
+    CODEC = 'mp3'
+    FALLBACK = 'aac'
+    DEFAULT = ('mp3', 192)
+    MAX_BITRATE = 320
+    HEADROOM = 2.0
+    UPGRADE = True
+    UPGRADE_BATCH = 5
+    IDLE_SEC = 60
+
+    def __init__(self, codec: str=CODEC, fallback: str | None=FALLBACK, max_bitrate: int=MAX_BITRATE,
+                 headroom: float=HEADROOM, upgrade: bool=UPGRADE) -> None:
+        self.codec = codec
+        self.fallback = fallback
+        self.max_bitrate = max_bitrate
+        self.headroom = headroom
+        self.upgrade = upgrade
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> 'QualityPolicy':
+        """
+        Create the policy with `quality` section of the settings.
+        :param settings:
+        :return:
+        """
+        return cls(settings.get('codec', cls.CODEC), settings.get('fallback', cls.FALLBACK),
+                   settings.get('max_bitrate', cls.MAX_BITRATE), settings.get('headroom', cls.HEADROOM),
+                   settings.get('upgrade', cls.UPGRADE))
+
+    def codecs(self) -> tuple[str, ...]:
+        """
+        Get the allowed codecs, the preferred one first.
+        :return:
+        """
+        return (self.codec,) if self.fallback in (None, self.codec) else (self.codec, self.fallback)
+
+    def choose(self, options: list[tuple[str, int]], throughput: float=None) -> tuple[str, int]:
+        """
+        Choose the download option.
+        :param options: Codec and bitrate (kbps) pairs of the track download info.
+        :param throughput: Bytes per second, None if it is not measured yet.
+        :return: Codec and bitrate.
+        """
+        allowed = [_o for _o in options if _o[0] in self.codecs()]
+        allowed = [_o for _o in allowed if _o[1] <= self.max_bitrate] or allowed
+        if not allowed:
+            return QualityPolicy.DEFAULT
+
+        # kbps to bytes per second
+        fits = allowed if throughput is None else \
+            [_o for _o in allowed if _o[1] * 125 * self.headroom <= throughput]
+        for codec in self.codecs():
+            best = max((_o for _o in fits if _o[0] == codec), key=lambda o: o[1], default=None)
+            if best is not None:
+                return best
+
+        return min(allowed, key=lambda o: o[1])
+
+    def is_upgrade(self, cached: tuple[str, int], best: tuple[str, int]) -> bool:
+        """
+        Check if the best option is better than the cached file.
+        :param cached: Codec and bitrate of the cached file.
+        :param best: Choice of the policy without the throughput limit.
+        :return:
+        """
+        if cached[0] != best[0]:
+            return best[0] == self.codec
+
+        return best[1] > (cached[1] or 0)
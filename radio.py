@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Endless radio of the similar tracks.
+"""
+from collections import deque
+from threading import Lock
+
+from yaclient import YaClient, Track
+
+
+class SimilarRadio:
+    """
+    Keeps the similar tracks queue going: when few tracks are left the next batch is fetched for the recently
+    played tracks, the tracks which were queued or played already are skipped.
+    `start` and `next_batch` make the network requests and run in background, `played` is called by the GUI.
+    """
+    __slots__ = ('yac', 'seeds', 'used', 'seen', 'history', '_generation', '_lock')
+
+    # Tracks left in the queue when the next batch is requested
+    LOW_WATER = 3
+    SEEDS = 3
+    HISTORY = 1000
+
+    def __init__(self, yac: YaClient) -> None:
+        self.yac = yac
+        # Recently played track ids, the newest last
+        self.seeds: deque[str] = deque(maxlen=SimilarRadio.SEEDS * 4)
+        # Seeds which have given their batch already
+        self.used: set[str] = set()
+        # Ids of the queued tracks
+        self.seen: set[str] = set()
+        self.history: deque[str] = deque(maxlen=SimilarRadio.HISTORY)
+        self._generation = 0
+        self._lock = Lock()
+
+    def start(self, track_id: int | str) -> list[Track]:
+        """
+        Start the radio for the track, the previous queue is forgotten but the play history is kept.
+        :param track_id:
+        :return: First batch.
+        """
+        tracks = self.yac.fetch_similar(track_id)
+        with self._lock:
+            self._generation += 1
+            self.seeds.clear()
+            self.used = {str(track_id)}
+            self.seen = set()
+            # The radio asked for explicitly may repeat the played tracks
+            return self._fresh(tracks, set())
+
+    def played(self, track: Track) -> None:
+        """
+        Remember the played track as a seed of the next batch.
+        :param track:
+        :return:
+        """
+        with self._lock:
+            self.history.append(str(track.id))
+            if str(track.id) not in self.used:
+                self.seeds.append(str(track.id))
+
+    def needs_more(self, idx: int, total: int) -> bool:
+        """
+        Check if the next batch should be fetched.
+        :param idx: Index of the playing track.
+        :param total: Length of the queue.
+        :return:
+        """
+        return total - idx - 1 <= SimilarRadio.LOW_WATER
+
+    def next_batch(self) -> list[Track]:
+        """
+        Fetch the similar tracks of the recent seeds, interleaved so the batch isn't about one track.
+        :return: New tracks, empty if the seeds gave nothing new.
+        """
+        with self._lock:
+            generation = self._generation
+            seeds = [_tid for _tid in reversed(self.seeds) if _tid not in self.used][:SimilarRadio.SEEDS]
+            if not seeds:
+                # Nothing new is played, the older seeds are asked again
+                seeds = list(reversed(self.seeds))[:SimilarRadio.SEEDS]
+            self.used.update(seeds)
+
+        radios = [self.yac.fetch_similar(_tid) for _tid in seeds]
+        mixed = [_r[_i] for _i in range(max(map(len, radios), default=0)) for _r in radios if _i < len(_r)]
+        with self._lock:
+            # The radio has been restarted meanwhile
+            if generation != self._generation:
+                return []
+
+            return self._fresh(mixed, set(self.history))
+
+    def _fresh(self, tracks: list[Track], played: set[str]) -> list[Track]:
+        fresh = []
+        for _tr in tracks:
+            _tid = str(_tr.id)
+            if _tid not in self.seen and _tid not in played:
+                self.seen.add(_tid)
+                fresh.append(_tr)
+
+        return fresh
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Startup helpers: phase timing for `--profile-startup` and background import of the heavy modules.
+"""
+from importlib import import_module
+from threading import Thread
+from time import perf_counter
+
+
+class StartupProfiler:
+    """
+    Collects the duration of the startup phases, every mark closes the phase started by the previous one.
+    """
+    __slots__ = ('enabled', 'started', 'last', 'phases')
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.started = self.last = perf_counter()
+        self.phases: list[tuple[str, float]] = []
+
+    def mark(self, phase: str) -> None:
+        """
+        Finish the phase.
+        :param phase:
+        :return:
+        """
+        if not self.enabled:
+            return
+
+        now = perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self) -> str:
+        """
+        Get the phase-by-phase timing breakdown.
+        :return:
+        """
+        width = max((len(_ph) for _ph, _ in self.phases), default=0) + 2
+        lines = [f'  {_ph:<{width}}{_dt * 1000:8.1f} ms' for _ph, _dt in self.phases]
+        lines.append(f'  {"total":<{width}}{(self.last - self.started) * 1000:8.1f} ms')
+        return '\n'.join(['Startup profile:', *lines])
+
+
+PROFILER = StartupProfiler()
+
+
+def prewarm(*modules: str) -> Thread:
+    """
+    Import the modules in background while the main thread initialises Qt.
+    The later import at the main thread gets the loaded module or waits for the import to finish.
+    :param modules:
+    :return:
+    """
+    _th = Thread(target=lambda: [import_module(_m) for _m in modules], name='prewarm', daemon=True)
+    _th.start()
+    return _th
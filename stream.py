@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+Local HTTP proxy for the progressive playback of tracks which are still downloading.
+"""
+import os
+import re
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Condition, Lock, Thread
+import requests
+from yandex_music.exceptions import YandexMusicError
+
+from cache import part_path
+from transport import content_range
+from yaclient import YaClient, Track
+
+
+class Transfer:  # pylint: disable=too-many-instance-attributes
+    """
+    Download of the track into the `.part` file which can be read while it is growing.
+    The part left by the interrupted download is continued, so it is readable from the start at once.
+    """
+    __slots__ = ('yac', 'track', 'path', 'part', 'link', 'size', 'written', 'done', 'error', 'cond')
+
+    CHUNK = 64 * 1024
+    TIMEOUT = (5, 30)
+
+    def __init__(self, yac: YaClient, track: Track) -> None:
+        self.yac = yac
+        self.track = track
+        self.path = yac.track_path(track)
+        self.part = part_path(self.path)
+        self.link: str = None
+        self.size: int = None
+        self.written = 0
+        self.done = False
+        self.error: Exception = None
+        self.cond = Condition()
+        Thread(target=self._run, name=f'transfer-{track.id}', daemon=True).start()
+
+    def wait_headers(self) -> bool:
+        """
+        Wait until the response headers are received.
+        :return: False if the download failed.
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.size is not None or self.written > 0 or self.done)
+
+        return self.error is None
+
+    def wait_data(self, offset: int) -> int:
+        """
+        Wait until the data beyond the offset is written.
+        :param offset:
+        :return: Number of available bytes from the offset.
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.written > offset or self.done)
+            return self.written - offset
+
+    def wait(self) -> None:
+        """
+        Wait for the download completion.
+        :return:
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.done)
+
+        if self.error is not None:
+            raise self.error
+
+    def _run(self) -> None:
+        try:
+            link, codec, bitrate = self.yac.direct_link(self.track)
+            with self.cond:
+                self.link = link
+                # The codec and the bitrate are known only now
+                self.path = self.yac.cache.track_path(self.track.id, codec)
+                self.part = part_path(self.path, str(bitrate))
+            size = self.yac.clt.request.download_file(link, self.path, self._progress, str(bitrate))
+            self.yac.cache.add(self.path, self.track.id, codec, bitrate, size)
+        except (requests.RequestException, YandexMusicError, OSError) as e:
+            print('Streaming failed:', self.track.title, e)
+            self.error = e
+        finally:
+            with self.cond:
+                self.done = True
+                self.cond.notify_all()
+
+    def _progress(self, size: int | None, written: int) -> None:
+        with self.cond:
+            self.size = size
+            self.written = written
+            self.cond.notify_all()
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    """
+    Serves `/<track id>` from the cache file, the growing `.part` file or the ranged upstream request.
+    """
+    server: 'StreamServer'
+    protocol_version = 'HTTP/1.1'
+    RANGE = re.compile(r'bytes=(\d*)-(\d*)')
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """
+        Handle GET request.
+        :return:
+        """
+        track = self.server.tracks.get(self.path.strip('/'))
+        if track is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        try:
+            tr = self.server.transfer(track)
+            if tr is None:
+                self._send_file(self.server.yac.track_path(track))
+            else:
+                self._send_transfer(tr)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except requests.RequestException as e:
+            print('Streaming failed:', track.title, e)
+
+    def log_message(self, *_) -> None:  # pylint: disable=arguments-differ
+        """
+        Keep the console clean.
+        :return:
+        """
+
+    def _range(self, size: int | None) -> tuple[int, int | None]:
+        _m = _StreamHandler.RANGE.fullmatch(self.headers.get('Range', ''))
+        if _m is None or not _m.group(1):
+            return 0, None if size is None else size - 1
+
+        end = int(_m.group(2)) if _m.group(2) else None
+        if size is not None:
+            end = size - 1 if end is None else min(end, size - 1)
+
+        return int(_m.group(1)), end
+
+    def _send_headers(self, start: int, end: int | None, size: int | None, fname: str) -> None:
+        ranged = 'Range' in self.headers and size is not None
+        self.send_response(HTTPStatus.PARTIAL_CONTENT if ranged else HTTPStatus.OK)
+        self.send_header('Content-Type', 'audio/aac' if fname.endswith('.aac') else 'audio/mpeg')
+        self.send_header('Accept-Ranges', 'bytes')
+        if size is not None:
+            self.send_header('Content-Length', str(end - start + 1))
+            if ranged:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+
+        self.end_headers()
+
+    def _send_file(self, fname: str) -> None:
+        size = os.path.getsize(fname)
+        start, end = self._range(size)
+        self._send_headers(start, end, size, fname)
+        with open(fname, 'rb') as fh:
+            fh.seek(start)
+            left = end - start + 1
+            while left > 0:
+                chunk = fh.read(min(Transfer.CHUNK, left))
+                if not chunk:
+                    break
+
+                self.wfile.write(chunk)
+                left -= len(chunk)
+
+    def _send_transfer(self, tr: Transfer) -> None:
+        if not tr.wait_headers():
+            self.send_error(HTTPStatus.BAD_GATEWAY)
+            return
+
+        start, end = self._range(tr.size)
+        # Without the total size the part can't be answered with the range, the players take 200 as the file start
+        if start > tr.written + StreamServer.AHEAD or (start and tr.size is None):
+            self._send_upstream(tr.link, start, end, tr.size, tr.path)
+            return
+
+        try:
+            fh = open(tr.part, 'rb')  # pylint: disable=consider-using-with
+        except FileNotFoundError:
+            self._send_file(tr.path)
+            return
+
+        self._send_headers(start, end, tr.size, tr.path)
+        pos = start
+        with fh:
+            while end is None or pos <= end:
+                avail = tr.wait_data(pos)
+                if avail <= 0:
+                    break
+
+                fh.seek(pos)
+                chunk = fh.read(min(avail, Transfer.CHUNK) if end is None else min(avail, end - pos + 1))
+                self.wfile.write(chunk)
+                pos += len(chunk)
+
+    def _send_upstream(self, link: str, start: int, end: int | None, size: int | None, fname: str) -> None:
+        """
+        Seek beyond the downloaded region: proxy the ranged request without caching.
+        The total size is taken from the upstream range if the download doesn't know it yet.
+        """
+        headers = {'Range': f'bytes={start}-{"" if end is None else end}'}
+        with self.server.yac.clt.request.session.get(link, headers=headers, stream=True,
+                                                     timeout=Transfer.TIMEOUT) as resp:
+            size = size or content_range(resp)[1]
+            if resp.status_code != HTTPStatus.PARTIAL_CONTENT or size is None:
+                self.send_error(HTTPStatus.BAD_GATEWAY)
+                return
+
+            end = size - 1 if end is None else min(end, size - 1)
+            self._send_headers(start, end, size, fname)
+            for chunk in resp.iter_content(Transfer.CHUNK):
+                self.wfile.write(chunk)
+
+
+class StreamServer(ThreadingHTTPServer):
+    """
+    Loopback HTTP server which lets QMediaPlayer start playing before the download is finished.
+    """
+    daemon_threads = True
+    AHEAD = 512 * 1024
+
+    def __init__(self, yac: YaClient) -> None:
+        super().__init__(('127.0.0.1', 0), _StreamHandler)
+        self.yac = yac
+        self.tracks: dict[str, Track] = {}
+        self.transfers: dict[str, Transfer] = {}
+        self._lock = Lock()
+        Thread(target=self.serve_forever, name='stream-server', daemon=True).start()
+
+    def url(self, track: Track) -> str:
+        """
+        Get the local URL of the track.
+        :param track:
+        :return:
+        """
+        self.tracks[str(track.id)] = track
+        return f'http://127.0.0.1:{self.server_address[1]}/{track.id}'
+
+    def transfer(self, track: Track) -> Transfer | None:
+        """
+        Get the running download of the track or start the new one.
+        :param track:
+        :return: None if the track is already cached.
+        """
+        with self._lock:
+            tr = self.transfers.get(str(track.id))
+            if tr is not None and tr.done:
+                del self.transfers[str(track.id)]
+                tr = None
+            if tr is None:
+                if self.yac.is_cached(track):
+                    return None
+
+                tr = self.transfers[str(track.id)] = Transfer(self.yac, track)
+
+            return tr
+
+    def download(self, track: Track) -> None:
+        """
+        Download the track to cache, joins the running transfer if any.
+        :param track:
+        :return:
+        """
+        tr = self.transfer(track)
+        if tr is not None:
+            tr.wait()
+
+    def stop(self) -> None:
+        """
+        Stop serving.
+        :return:
+        """
+        self.shutdown()
+        self.server_close()
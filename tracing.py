@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentation of the hot paths: timing spans of the calls, GUI thread stalls and Chrome trace export.
+"""
+import json
+import os
+from collections import deque
+from functools import wraps
+import inspect
+from threading import Lock, current_thread, get_ident
+from time import perf_counter
+from types import FunctionType
+from typing import Callable
+
+
+class Tracer:  # pylint: disable=too-many-instance-attributes
+    """
+    Records the spans of the instrumented methods from any thread. The methods are wrapped by `instrument`
+    only when the tracer is enabled, so there is no overhead at all when it is off.
+    The stalls of the event loop are detected by `heartbeat` which is called by a GUI timer every `TICK_MS`.
+    """
+    __slots__ = ('enabled', 'stall_ms', 'origin', 'events', 'stats', 'threads', '_lock', '_beat')
+
+    CAPACITY = 200000
+    STALL_MS = 100
+    TICK_MS = 50
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.stall_ms = Tracer.STALL_MS
+        self.origin = perf_counter()
+        # Name, category, start, end and thread of the spans, the oldest ones are dropped
+        self.events: deque[tuple[str, str, float, float, int]] = deque(maxlen=Tracer.CAPACITY)
+        # Count, total and max duration of the spans by name
+        self.stats: dict[str, list] = {}
+        self.threads: dict[int, str] = {}
+        self._lock = Lock()
+        self._beat: float = None
+
+    def record(self, name: str, category: str, start: float, end: float) -> None:
+        """
+        Keep the finished span.
+        :param name:
+        :param category:
+        :param start: perf_counter() time.
+        :param end:
+        :return:
+        """
+        tid = get_ident()
+        duration = end - start
+        with self._lock:
+            self.events.append((name, category, start, end, tid))
+            stat = self.stats.get(name)
+            if stat is None:
+                self.stats[name] = [1, duration, duration]
+            else:
+                stat[0] += 1
+                stat[1] += duration
+                stat[2] = max(stat[2], duration)
+            if tid not in self.threads:
+                self.threads[tid] = current_thread().name
+
+    def instrument(self, cls: type, category: str, names: tuple[str, ...]=None) -> None:
+        """
+        Wrap the methods of the class with the spans named `<class>.<method>`. Does nothing when the tracer is off.
+        :param cls:
+        :param category:
+        :param names: Methods to wrap, all methods defined at the class except the special ones if omitted.
+        :return:
+        """
+        if not self.enabled:
+            return
+
+        for name, attr in list(vars(cls).items()):
+            if names is None and name.startswith('__') and name.endswith('__') or \
+                    names is not None and name not in names:
+                continue
+
+            title = f'{cls.__name__}.{name.replace(f"_{cls.__name__}__", "__")}'
+            if isinstance(attr, staticmethod):
+                setattr(cls, name, staticmethod(self._wrap(attr.__func__, title, category)))
+            elif isinstance(attr, FunctionType):
+                setattr(cls, name, self._wrap(attr, title, category))
+
+    def _wrap(self, fn: Callable, name: str, category: str) -> Callable:
+        # Qt drops the extra signal arguments by the slot signature, the wrapper has to do it the same way
+        params = inspect.signature(fn).parameters.values()
+        count = None if any(_p.kind == _p.VAR_POSITIONAL for _p in params) else \
+            sum(_p.kind in (_p.POSITIONAL_ONLY, _p.POSITIONAL_OR_KEYWORD) for _p in params)
+
+        @wraps(fn)
+        def traced(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return fn(*args[:count], **kwargs)
+            finally:
+                self.record(name, category, start, perf_counter())
+
+        return traced
+
+    def heartbeat(self) -> None:
+        """
+        Called by the GUI thread timer, the late call means the event loop was blocked.
+        :return:
+        """
+        now = perf_counter()
+        if self._beat is not None and (now - self._beat) * 1000 > Tracer.TICK_MS + self.stall_ms:
+            self.record('stall', 'stall', self._beat + Tracer.TICK_MS / 1000, now)
+
+        self._beat = now
+
+    def summary(self) -> str:
+        """
+        Get the live counters for the status bar.
+        :return:
+        """
+        with self._lock:
+            spans = sum(_st[0] for _st in self.stats.values())
+            stalls = self.stats.get('stall', (0, 0, 0))
+            top = max(((_st[1], _name) for _name, _st in self.stats.items() if _name != 'stall'), default=None)
+
+        text = f'Spans: {spans} | Stalls: {stalls[0]}, max {stalls[2] * 1000:.0f} ms'
+        return text if top is None else f'{text} | Top: {top[1]} {top[0] * 1000:.0f} ms'
+
+    def export(self, fname: str) -> None:
+        """
+        Write the spans as Chrome trace (chrome://tracing, Perfetto) with the per-name counters.
+        :param fname:
+        :return:
+        """
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+            stats = {_name: {'count': _st[0], 'total_ms': round(_st[1] * 1000, 3), 'max_ms': round(_st[2] * 1000, 3)}
+                     for _name, _st in self.stats.items()}
+
+        trace = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': _tid, 'args': {'name': _name}}
+                 for _tid, _name in threads.items()]
+        trace.extend({'name': _name, 'cat': _cat, 'ph': 'X', 'pid': pid, 'tid': _tid,
+                      'ts': round((_start - self.origin) * 1e6, 1), 'dur': round((_end - _start) * 1e6, 1)}
+                     for _name, _cat, _start, _end, _tid in events)
+        with open(fname, 'w', encoding='utf-8') as fh:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms', 'otherData': {'stats': stats}}, fh)
+
+
+TRACER = Tracer()
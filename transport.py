@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP transport of the Yandex music client: pooled keep-alive connections, timeouts, retries, resumable
+downloads and metrics.
+"""
+import os
+import re
+from collections import deque
+from contextlib import contextmanager
+from random import uniform
+from threading import Lock
+from time import monotonic, perf_counter, sleep
+from typing import Callable, Iterator
+import requests
+from requests.adapters import HTTPAdapter
+from yandex_music.exceptions import BadRequestError, NetworkError, NotFoundError, TimedOutError, \
+    UnauthorizedError, YandexMusicError
+from yandex_music.utils.request import Request, USER_AGENT, default_timeout
+
+from cache import part_path
+
+
+def content_range(resp: requests.Response) -> tuple[int, int | None]:
+    """
+    Parse Content-Range header of the response, `bytes 100-199/1000` or `bytes */1000`.
+    :param resp:
+    :return: First byte and the full size if it is known.
+    """
+    match = re.fullmatch(r'bytes (?:(\d+)-\d+|\*)/(\d+|\*)', resp.headers.get('Content-Range', '').strip())
+    if match is None:
+        return 0, None
+
+    return int(match[1] or 0), int(match[2]) if match[2] != '*' else None
+
+
+class TransportStats:  # pylint: disable=too-many-instance-attributes
+    """
+    Request latency and retry counters and the download throughput, shared by the worker threads.
+    """
+    __slots__ = ('requests', 'retries', 'failures', 'latencies', 'throughput', 'active', 'idle_since', '_lock')
+
+    WINDOW = 256
+    # Weight of the last download at the throughput average
+    SMOOTHING = 0.3
+    # Smaller downloads measure the latency rather than the throughput
+    MIN_BYTES = 64 * 1024
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        # Latencies of the recent requests for the percentiles
+        self.latencies: deque[float] = deque(maxlen=TransportStats.WINDOW)
+        # Bytes per second, None until the first download
+        self.throughput: float = None
+        self.active = 0
+        self.idle_since = monotonic()
+        self._lock = Lock()
+
+    def add(self, latency: float, retries: int, failed: bool) -> None:
+        """
+        Count the finished request.
+        :param latency: Seconds of the last attempt.
+        :param retries:
+        :param failed:
+        :return:
+        """
+        with self._lock:
+            self.requests += 1
+            self.retries += retries
+            self.failures += failed
+            self.latencies.append(latency)
+
+    def add_transfer(self, received: int, seconds: float) -> None:
+        """
+        Update the throughput with the finished download attempt.
+        :param received: Bytes of the attempt.
+        :param seconds: Duration of the attempt including the request latency.
+        :return:
+        """
+        if received < TransportStats.MIN_BYTES or seconds <= 0:
+            return
+
+        with self._lock:
+            rate = received / seconds
+            self.throughput = rate if self.throughput is None else \
+                self.throughput + TransportStats.SMOOTHING * (rate - self.throughput)
+
+    @contextmanager
+    def busy(self) -> Iterator[None]:
+        """
+        Count the request in flight.
+        :return:
+        """
+        with self._lock:
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active -= 1
+                if not self.active:
+                    self.idle_since = monotonic()
+
+    def idle_for(self) -> float:
+        """
+        Get the time since the last request has finished.
+        :return: Seconds, 0 if there are requests in flight.
+        """
+        with self._lock:
+            return 0.0 if self.active else monotonic() - self.idle_since
+
+    def percentile(self, pct: int) -> float:
+        """
+        Get the latency percentile of the recent requests.
+        :param pct:
+        :return: Seconds.
+        """
+        with self._lock:
+            latencies = sorted(self.latencies)
+
+        return latencies[min(len(latencies) - 1, len(latencies) * pct // 100)] if latencies else 0.0
+
+    def describe(self) -> str:
+        """
+        Get the short description for the status bar.
+        :return:
+        """
+        rate = '' if self.throughput is None else f', {self.throughput / 1024:.0f} KB/s'
+        return (f'HTTP: {self.requests} req, p50 {self.percentile(50) * 1000:.0f} ms, '
+                f'p95 {self.percentile(95) * 1000:.0f} ms, {self.retries} retries, {self.failures} failed{rate}')
+
+
+class _SharedPart:  # pylint: disable=too-few-public-methods
+    """
+    Part file of the downloads of the same file variant. The downloads take the lock in turn, the waiting one
+    gets the size of the file finished meanwhile.
+    """
+    __slots__ = ('lock', 'users', 'size')
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.users = 0
+        self.size: int = None
+
+
+class PooledRequest(Request):
+    """
+    `yandex_music` request sender with one `requests.Session` for all threads. The connection pool is sized
+    for the parallel downloads, the connect and read timeouts are separate. Idempotent requests are retried
+    on the network errors, 429 and 5xx with the jittered exponential backoff.
+    The files are downloaded to `<file>.part`, the interrupted download is continued with Range request.
+    The concurrent downloads of the same part file run one by one, the later ones take the finished file.
+    """
+    POOL = 16
+    CONNECT_TIMEOUT = 5
+    READ_TIMEOUT = 30
+    RETRIES = 3
+    BACKOFF = 0.5
+    BACKOFF_MAX = 8
+    RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+    CHUNK = 64 * 1024
+    # POST requests which only read the data
+    READ_POSTS = re.compile(r'.*/(tracks|playlists)')
+    _parts: dict[str, _SharedPart] = {}
+    _parts_lock = Lock()
+
+    def __init__(self, pool: int=POOL, connect_timeout: float=CONNECT_TIMEOUT, read_timeout: float=READ_TIMEOUT,
+                 retries: int=RETRIES, backoff: float=BACKOFF) -> None:
+        super().__init__(timeout=(connect_timeout, read_timeout))
+        self.retries = retries
+        self.backoff = backoff
+        self.stats = TransportStats()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> 'PooledRequest':
+        """
+        Create the transport with `transport` section of the settings.
+        :param settings:
+        :return:
+        """
+        return cls(settings.get('pool', cls.POOL), settings.get('connect_timeout', cls.CONNECT_TIMEOUT),
+                   settings.get('read_timeout', cls.READ_TIMEOUT), settings.get('retries', cls.RETRIES),
+                   settings.get('backoff', cls.BACKOFF))
+
+    def is_idempotent(self, method: str, url: str) -> bool:
+        """
+        Check if the request can be repeated safely.
+        :param method:
+        :param url:
+        :return:
+        """
+        return method in ('GET', 'HEAD') or method == 'POST' and PooledRequest.READ_POSTS.fullmatch(url) is not None
+
+    def delay(self, attempt: int, resp: requests.Response=None) -> float:
+        """
+        Get the pause before the next attempt, Retry-After of the response is respected.
+        :param attempt: Number of the failed attempts.
+        :param resp:
+        :return: Seconds.
+        """
+        after = resp.headers.get('Retry-After', '') if resp is not None else ''
+        if after.isdigit():
+            return min(float(after), PooledRequest.BACKOFF_MAX)
+
+        return uniform(0, min(PooledRequest.BACKOFF_MAX, self.backoff * 2 ** attempt))
+
+    def _request_wrapper(self, method: str, url: str, **kwargs):  # pylint: disable=arguments-differ
+        """
+        Send the request with the session like `Request._request_wrapper` does with `requests.request`.
+        :param method:
+        :param url:
+        :param kwargs:
+        :return: Response body.
+        """
+        kwargs['headers'] = {**kwargs.get('headers', {}), 'User-Agent': USER_AGENT}
+        if kwargs.get('timeout', default_timeout) is default_timeout:
+            kwargs['timeout'] = self._timeout
+
+        with self.stats.busy():
+            return self._send(method, url, self.retries + 1 if self.is_idempotent(method, url) else 1, **kwargs)
+
+    def _send(self, method: str, url: str, attempts: int, **kwargs) -> bytes:
+        for attempt in range(attempts):
+            start = perf_counter()
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                if attempt + 1 < attempts:
+                    sleep(self.delay(attempt))
+                    continue
+
+                self.stats.add(perf_counter() - start, attempt, True)
+                if isinstance(e, requests.Timeout):
+                    raise TimedOutError from e
+                raise NetworkError(e) from e
+
+            if resp.status_code in PooledRequest.RETRY_STATUSES and attempt + 1 < attempts:
+                sleep(self.delay(attempt, resp))
+                continue
+
+            self.stats.add(perf_counter() - start, attempt, not 200 <= resp.status_code <= 299)
+            return self._content(resp)
+
+        raise NetworkError('No attempts')
+
+    def download_file(self, url: str, fname: str, progress: Callable[[int | None, int], None]=None,
+                      variant: str=None) -> int:
+        """
+        Download the file, the part left by the failed attempt or the previous run is continued.
+        The file appears at `fname` only when its size matches the size reported by the server.
+        :param url:
+        :param fname:
+        :param progress: Called with the full size and the written bytes after every chunk, the part file
+                         is flushed before.
+        :param variant: Variant of the file content, e.g. the bitrate, the parts of other variants are not continued.
+        :return: File size.
+        """
+        part = part_path(fname, variant)
+        with self.stats.busy(), self._shared(part) as shared:
+            if shared.size is not None and os.path.isfile(fname) and os.path.getsize(fname) == shared.size:
+                return shared.size
+
+            shared.size = self._download(url, fname, part, progress)
+            return shared.size
+
+    @classmethod
+    @contextmanager
+    def _shared(cls, part: str) -> Iterator[_SharedPart]:
+        """
+        Hold the part file exclusively for the download and the rename.
+        :param part:
+        :return:
+        """
+        with cls._parts_lock:
+            shared = cls._parts.setdefault(part, _SharedPart())
+            shared.users += 1
+        try:
+            with shared.lock:
+                yield shared
+        finally:
+            with cls._parts_lock:
+                shared.users -= 1
+                if not shared.users:
+                    del cls._parts[part]
+
+    def _download(self, url: str, fname: str, part: str, progress: Callable[[int | None, int], None]) -> int:
+        error: Exception = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                sleep(self.delay(attempt - 1))
+
+            start = perf_counter()
+            try:
+                written, size, received = self._download_part(url, part, progress)
+            except requests.RequestException as e:
+                error = e
+                continue
+
+            self.stats.add_transfer(received, perf_counter() - start)
+            if size is None or written == size:
+                self.stats.add(perf_counter() - start, attempt, False)
+                os.replace(part, fname)
+                # The part is checked by the written bytes, the file is checked as it is at the cache
+                actual = os.path.getsize(fname)
+                if size is not None and actual != size:
+                    os.remove(fname)
+                    raise NetworkError(f'Corrupted download: {actual} of {size} bytes')
+                return written
+
+            error = NetworkError(f'Incomplete download: {written} of {size} bytes')
+
+        self.stats.add(perf_counter() - start, self.retries, True)
+        if isinstance(error, requests.Timeout):
+            raise TimedOutError from error
+        raise NetworkError(error) from error
+
+    def _download_part(self, url: str, part: str,
+                       progress: Callable[[int | None, int], None]) -> tuple[int, int | None, int]:
+        offset = os.path.getsize(part) if os.path.isfile(part) else 0
+        headers = {'User-Agent': USER_AGENT}
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+
+        with self.session.get(url, headers=headers, stream=True, timeout=self._timeout) as resp:
+            if resp.status_code == 416:
+                # The part is complete already or the file has changed at the server
+                size = content_range(resp)[1]
+                if size == offset:
+                    return offset, size, 0
+
+                os.remove(part)
+                raise requests.HTTPError(f'Range is not satisfiable: {offset} of {size} bytes', response=resp)
+
+            if resp.status_code in PooledRequest.RETRY_STATUSES:
+                resp.raise_for_status()
+            if not 200 <= resp.status_code <= 299:
+                self._content(resp)
+
+            if resp.status_code == 206:
+                first, size = content_range(resp)
+                if first != offset:
+                    os.remove(part)
+                    raise requests.HTTPError(f'Unexpected range from {first} instead of {offset}', response=resp)
+            else:
+                # The server ignored the range and sent the whole file
+                offset = 0
+                size = int(resp.headers.get('Content-Length', 0)) or None
+
+            written = offset
+            with open(part, 'ab' if offset else 'wb') as fh:
+                if progress is not None:
+                    progress(size, written)
+                for chunk in resp.iter_content(PooledRequest.CHUNK):
+                    fh.write(chunk)
+                    written += len(chunk)
+                    if progress is not None:
+                        fh.flush()
+                        progress(size, written)
+
+        return written, size, written - offset
+
+    def _content(self, resp: requests.Response) -> bytes:
+        """
+        Get the body of the successful response or raise the exception like `Request._request_wrapper` does.
+        :param resp:
+        :return:
+        """
+        if 200 <= resp.status_code <= 299:
+            return resp.content
+
+        try:
+            message = self._parse(resp.content).get_error()
+        except YandexMusicError:
+            message = 'Unknown HTTPError'
+
+        if resp.status_code in (401, 403):
+            raise UnauthorizedError(message)
+        if resp.status_code == 400:
+            raise BadRequestError(message)
+        if resp.status_code == 404:
+            raise NotFoundError(message)
+        if resp.status_code in (409, 413):
+            raise NetworkError(message)
+        if resp.status_code == 502:
+            raise NetworkError('Bad Gateway')
+
+        raise NetworkError(f'{message} ({resp.status_code}): {resp.content}')
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of the compiled UI forms.
+"""
+import os
+from importlib.util import module_from_spec, spec_from_file_location
+from PyQt5.QtWidgets import QWidget
+
+UI_DIR = f'{os.getcwd()}/ui'
+ROOT = f'{os.getcwd()}/.cache/ui'
+
+
+def setup_ui(name: str, widget: QWidget) -> None:
+    """
+    Set up the widget with the form `ui/<name>.ui` like `uic.loadUi` does.
+    The form is compiled to `.cache/ui/ui_<name>.py` which is regenerated only when the .ui file changes,
+    so the XML parsing and `uic` import are skipped on the usual start.
+    :param name:
+    :param widget:
+    :return:
+    """
+    src = f'{UI_DIR}/{name}.ui'
+    dst = f'{ROOT}/ui_{name}.py'
+    mtime = os.stat(src).st_mtime_ns
+    try:
+        fresh = os.stat(dst).st_mtime_ns == mtime
+    except FileNotFoundError:
+        fresh = False
+
+    if not fresh:
+        from PyQt5 import uic  # pylint: disable=import-outside-toplevel
+        os.makedirs(ROOT, exist_ok=True)
+        with open(f'{dst}.tmp', 'w', encoding='utf-8') as fh:
+            uic.compileUi(src, fh)
+
+        # The compiled file gets the mtime of the .ui file, so any change of it is detected
+        os.utime(f'{dst}.tmp', ns=(mtime, mtime))
+        os.replace(f'{dst}.tmp', dst)
+
+    spec = spec_from_file_location(f'ui_{name}', dst)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    form = next(_cls for _name, _cls in vars(module).items() if _name.startswith('Ui_'))()
+    form.setupUi(widget)
+    for attr, value in vars(form).items():
+        setattr(widget, attr, value)
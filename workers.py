@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Background job runner for the blocking Yandex music calls.
+"""
+from typing import Any, Callable
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+
+
+class _JobSignals(QObject):  # pylint: disable=too-few-public-methods
+    """
+    QRunnable is not a QObject, so the job signals live here.
+    """
+    finished = pyqtSignal(object, object)
+    failed = pyqtSignal(object, object)
+
+
+class Job(QRunnable):  # pylint: disable=too-few-public-methods
+    """
+    Single call of the function at the thread pool.
+    """
+    def __init__(self, key: str, fn: Callable, args: tuple, kwargs: dict) -> None:
+        super().__init__()
+        self.setAutoDelete(False)
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = _JobSignals()
+
+    def run(self) -> None:
+        """
+        Call the function and deliver the result or the exception through the signals.
+        :return:
+        """
+        try:
+            res = self.fn(*self.args, **self.kwargs)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.signals.failed.emit(self, e)
+        else:
+            self.signals.finished.emit(self, res)
+
+
+class JobRunner(QObject):
+    """
+    Runs the jobs at the thread pool and delivers the results to the GUI thread.
+    Only the latest job with the same key is alive, the results of the stale ones are dropped.
+    """
+    progress = pyqtSignal(str)
+    failed = pyqtSignal(str, object)
+
+    def __init__(self, parent: QObject=None, max_threads: int=4) -> None:
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self.jobs: dict[str, tuple[Job, str, Callable, Callable]] = {}
+        self._alive: set[Job] = set()
+
+    def submit(self, key: str, description: str, fn: Callable, *args,
+               on_done: Callable[[Any], None]=None, on_error: Callable[[Exception], None]=None, **kwargs) -> None:
+        """
+        Run the function in background, the previous job with the same key becomes stale.
+        :param key: Jobs with the same key cancel each other.
+        :param description: Progress text for the status bar.
+        :param fn:
+        :param args:
+        :param on_done: Called in the GUI thread with the function result.
+        :param on_error: Called in the GUI thread with the exception, `failed` signal is emitted if omitted.
+        :param kwargs:
+        :return:
+        """
+        self.cancel(key)
+        job = Job(key, fn, args, kwargs)
+        job.signals.finished.connect(self._on_finished)
+        job.signals.failed.connect(self._on_failed)
+        self.jobs[key] = (job, description, on_done, on_error)
+        self._alive.add(job)
+        self.pool.start(job)
+        self._report()
+
+    def cancel(self, key: str) -> None:
+        """
+        Drop the job with given key. A job which is not started yet is removed from the queue.
+        :param key:
+        :return:
+        """
+        item = self.jobs.pop(key, None)
+        if item is not None:
+            if self.pool.tryTake(item[0]):
+                self._alive.discard(item[0])
+
+            self._report()
+
+    def cancel_all(self) -> None:
+        """
+        Drop all jobs.
+        :return:
+        """
+        for key in list(self.jobs):
+            self.cancel(key)
+
+    def is_running(self, key: str) -> bool:
+        """
+        Check if there is an alive job with given key.
+        :param key:
+        :return:
+        """
+        return key in self.jobs
+
+    def _take(self, job: Job) -> tuple[Job, str, Callable, Callable] | None:
+        self._alive.discard(job)
+        item = self.jobs.get(job.key)
+        if item is None or item[0] is not job:
+            return None
+
+        del self.jobs[job.key]
+        self._report()
+        return item
+
+    def _report(self) -> None:
+        if self.jobs:
+            self.progress.emit(f'{", ".join(item[1] for item in self.jobs.values())}...')
+
+    @pyqtSlot(object, object)
+    def _on_finished(self, job: Job, res: Any) -> None:
+        item = self._take(job)
+        if item is not None and item[2] is not None:
+            item[2](res)
+
+    @pyqtSlot(object, object)
+    def _on_failed(self, job: Job, e: Exception) -> None:
+        item = self._take(job)
+        if item is None:
+            return
+
+        if item[3] is not None:
+            item[3](e)
+        else:
+            self.failed.emit(item[1], e)
@@ -2,114 +2,391 @@
 Yandex music client wrapper.
 """
 import os
-from json import dump
-from glob import glob
+from threading import Lock, get_ident
+from yandex_music import Playlist
 from yandex_music.client import Client, Track
+from yandex_music.exceptions import BadRequestError, NetworkError, YandexMusicError
 from yandex_music.track_short import TrackShort
+from yandex_music.utils.difference import Difference
 
+from cache import TrackCache
+from library import Library
+from quality import QualityPolicy
+from transport import PooledRequest
 
-class YaClient:
+
+class YaClient:  # pylint: disable=too-many-instance-attributes,too-many-public-methods
     """
     Yandex music client some methods wrapper.
     """
-    __slots__ = ('clt', 'likes', 'playlist', 'similar')
+    __slots__ = ('clt', 'cache', 'library', 'quality', 'likes', 'liked', 'likes_revision', 'playlist', 'similar',
+                 'revisions', 'edit_lock', 'upgraded')
 
-    CODEC = 'mp3' # mp3, aac
-    CACHE_DIR = f'{os.getcwd()}/.cache'
-    TRACKS_DIR = f'{os.getcwd()}/.cache/tracks'
-    COVERS_DIR = f'{os.getcwd()}/.cache/covers'
+    CACHE_DIR = TrackCache.ROOT
+    EDIT_ATTEMPTS = 3
 
-    def __init__(self, token):
-        self.clt = Client(token).init()
+    def __init__(self, token, cache_budget_mb: int=TrackCache.BUDGET_MB, request: PooledRequest=None,
+                 quality: QualityPolicy=None):
+        self.clt = Client(token, request=request or PooledRequest())
+        self.cache = TrackCache(YaClient.CACHE_DIR, cache_budget_mb)
+        self.library = Library(YaClient.CACHE_DIR)
+        self.quality = quality or QualityPolicy()
         self.likes: list[Track] = []
+        # Ids of the liked tracks, updated optimistically by the GUI and reconciled by `sync_likes`
+        self.liked: set[str] = set()
+        self.likes_revision: int = None
         self.playlist: list[Track] = []
         self.similar: list[Track] = []
+        self.revisions: dict[int | str, tuple[int, list[Track]]] = {}
+        self.edit_lock = Lock()
+        # Ids of the tracks checked by `upgrade_cache`
+        self.upgraded: set[str] = set()
 
-        os.makedirs(YaClient.TRACKS_DIR, exist_ok=True)
+    def connect(self) -> bool:
+        """
+        Get the account status, the client works with the library snapshot only until it is connected.
+        :return: True if the token is valid.
+        """
+        self.clt.init()
+        return self.clt.me is not None
 
-    @staticmethod
-    def __get_codec(track: Track) -> tuple[str, int]:
+    def __get_codec(self, track: Track, throughput: float=None) -> tuple[str, int]:
         if track.download_info is None:
             track.get_download_info()
 
-        return max(((di.codec, di.bitrate_in_kbps) for di in track.download_info if di.codec == YaClient.CODEC),
-                   key=lambda x: x[1], default=('mp3', 192))
+        return self.quality.choose([(di.codec, di.bitrate_in_kbps) for di in track.download_info], throughput)
 
-    def download_track(self, track: Track) -> None:
+    def track_path(self, track: Track) -> str:
         """
-        Download the track file to cache directory.
+        Get the cache file path of the track, the file of any allowed codec if it is cached.
         :param track:
         :return:
         """
-        _name = f'{", ".join(track.artists_name())} - {track.title}'
-        _fname = f'{YaClient.COVERS_DIR}/{_name}.png'
-        if not os.path.isfile(_fname):
-            track.download_og_image(_fname)
+        for codec in self.quality.codecs():
+            _fname = self.cache.track_path(track.id, codec)
+            if os.path.isfile(_fname):
+                return _fname
+
+        return self.cache.track_path(track.id, self.quality.codec)
+
+    def cover_path(self, track: Track) -> str:
+        """
+        Get the cache file path of the track cover.
+        :param track:
+        :return:
+        """
+        return self.cache.cover_path(track.id)
+
+    def is_cached(self, track: Track) -> bool:
+        """
+        Check if the track file is already in cache directory.
+        :param track:
+        :return:
+        """
+        return os.path.isfile(self.track_path(track))
+
+    def track_played(self, track: Track) -> None:
+        """
+        Count the play of the track and protect its files from eviction while it is playing.
+        :param track:
+        :return:
+        """
+        _fname = self.track_path(track)
+        self.cache.touch(_fname, play=True)
+        self.cache.touch(self.cover_path(track))
+        self.cache.pinned = {_fname}
 
-        _fname = f'{YaClient.TRACKS_DIR}/{_name}.{YaClient.CODEC}'
+    def direct_link(self, track: Track) -> tuple[str, str, int]:
+        """
+        Get the direct download link of the track file, the quality is chosen by the measured throughput.
+        :param track:
+        :return: Link, codec and bitrate.
+        """
+        codec, bitrate = self.__get_codec(track, self.clt.request.stats.throughput)
+        return track.get_specific_download_info(codec, bitrate).get_direct_link(), codec, bitrate
+
+    def fetch_cover(self, track_id: int | str, og_image: str, size: str='200x200') -> str:
+        """
+        Download the cover to cache directory.
+        :param track_id:
+        :param og_image: Cover URL template of the track.
+        :param size:
+        :return: Cover file name.
+        """
+        _fname = self.cache.cover_path(track_id)
         if not os.path.isfile(_fname):
-            print('Downloading track:', _name)
-            track.download(_fname, *self.__get_codec(track))
+            # The file may be read and downloaded by other threads, so it appears only when it is complete
+            _part = f'{_fname}.{get_ident()}.part'
+            self.clt.request.download(f'https://{og_image.replace("%%", size)}', _part)
+            os.replace(_part, _fname)
+            self.cache.add(_fname, track_id)
 
-    def load_list(self, list_name: str, kind: int | str=None) -> None:
+        return _fname
+
+    def download_cover(self, track: Track) -> str | None:
         """
-        Load track list for the given playlist and update the playlist.
+        Download the track cover to cache directory.
+        :param track:
+        :return: Cover file name or None if the track has no cover.
+        """
+        return self.fetch_cover(track.id, track.og_image) if track.og_image else None
+
+    def download_track(self, track: Track) -> None:
+        """
+        Download the track file to cache directory, the interrupted download is resumed.
+        :param track:
+        :return:
+        """
+        if not self.is_cached(track):
+            print('Downloading track:', f'{", ".join(track.artists_name())} - {track.title}')
+            link, codec, bitrate = self.direct_link(track)
+            _fname = self.cache.track_path(track.id, codec)
+            size = self.clt.request.download_file(link, _fname, variant=str(bitrate))
+            self.cache.add(_fname, track.id, codec, bitrate, size)
+
+    def upgrade_cache(self, limit: int=QualityPolicy.UPGRADE_BATCH) -> int:
+        """
+        Download again the cached tracks of lower quality than the policy allows, e.g. which were downloaded
+        on a slow link. Every track is checked once, the playing track is skipped.
+        :param limit: Number of the tracks to check.
+        :return: Number of the upgraded tracks.
+        """
+        files = self.cache.upgradable(self.quality.codec, self.quality.max_bitrate, self.upgraded, limit)
+        self.upgraded.update(files)
+        upgraded = 0
+        for track in self.clt.tracks(list(files)) if files else []:
+            path, cached = files[str(track.id)]
+            codec, bitrate = self.__get_codec(track)
+            if not self.quality.is_upgrade(cached, (codec, bitrate)):
+                continue
+
+            print('Upgrading track:', f'{", ".join(track.artists_name())} - {track.title}', cached, bitrate)
+            _fname = self.cache.track_path(track.id, codec)
+            link = track.get_specific_download_info(codec, bitrate).get_direct_link()
+            size = self.clt.request.download_file(link, _fname, variant=str(bitrate))
+            self.cache.add(_fname, track.id, codec, bitrate, size)
+            if _fname != path:
+                self.cache.remove(path)
+            upgraded += 1
+
+        return upgraded
+
+    def scrub_cache(self) -> int:
+        """
+        Remove the damaged track files from cache and queue them for download again.
+        :return: Number of the removed files.
+        """
+        ids = self.cache.scrub()
+        self.cache.queue_add('repair', ids)
+        return len(ids)
+
+    def fetch_list(self, list_name: str, kind: int | str=None) -> list[Track | TrackShort]:
+        """
+        Fetch track list for the given playlist without updating the client state.
         :param list_name:
         :param kind:
         :return:
         """
         if list_name == 'likes':
-            _list = self.likes
-            _tracks = self.clt.users_likes_tracks().fetch_tracks()
-        else:
-            _list = self.playlist
-            _tracks = self.clt.users_playlists(kind).tracks
+            _likes = self.clt.users_likes_tracks()
+            tracks = _likes.fetch_tracks()
+            self.library.save_tracks('likes', _likes.revision, tracks)
+            return tracks
 
-        YaClient.update_playlist(list_name, _list, _tracks)
+        return self.clt.users_playlists(kind).tracks
 
-    def load_similar(self, track_id: int | str) -> bool:
+    def sync_likes(self) -> tuple[int, list[TrackShort]] | None:
         """
-        Get the similar tracks for given track.
-        :param track_id:
+        Fetch the ids of the liked tracks and compare the collection revision with the known one.
+        The tracks which are not at the collection yet are fetched in full by `LikesLoader`.
+        :return: New revision and the short tracks or None if the collection is not changed.
+        """
+        _likes = self.clt.users_likes_tracks()
+        return None if _likes.revision == self.likes_revision else (_likes.revision, _likes.tracks)
+
+    def fetch_playlists(self) -> list[Playlist]:
+        """
+        Fetch the list of user playlists and save it to the library snapshot.
         :return:
         """
-        self.similar.clear()
-        res = self.clt.tracks_similar(track_id)
-        if len(res.similar_tracks) > 0:
-            self.similar = res.similar_tracks
+        playlists = self.clt.users_playlists_list()
+        self.library.save_playlists(playlists)
+        return playlists
 
-        return len(self.similar) != 0
+    def fetch_playlist(self, kind: int | str) -> tuple[int, list[Track]]:
+        """
+        Fetch the playlist revision and tracks, remember them for the revision check.
+        :param kind:
+        :return:
+        """
+        _pl = self.clt.users_playlists(kind)
+        self.revisions[kind] = res = (_pl.revision, YaClient.full_tracks(_pl.tracks))
+        self.library.save_tracks(kind, *res)
+        return res
+
+    def cached_playlist(self, kind: int | str, revision: int) -> list[Track] | None:
+        """
+        Get the tracks of the playlist fetched before if its revision is not changed.
+        :param kind:
+        :param revision:
+        :return:
+        """
+        res = self.revisions.get(kind)
+        if res is None:
+            res = self.library.load_tracks(kind, self.clt)
+            if res is not None:
+                self.revisions[kind] = res
+
+        return res[1] if res is not None and res[0] == revision else None
+
+    def change_playlist(self, kind: int | str, delete: set[tuple[str, int]]=frozenset(),
+                        insert: list[Track]=()) -> tuple[int, list[Track]]:
+        """
+        Apply the batched edit to the playlist with a single diff request. The edits are queued by the lock
+        and expressed by track ids, so the edit is rebased to the fresh playlist on the revision conflict.
+        :param kind:
+        :param delete: Rows to remove by `occurrences` keys, so only the chosen copy of the repeated track
+                       is removed.
+        :param insert: Tracks to insert at the top, the tracks which are already at the playlist are skipped.
+        :return: New revision and tracks.
+        """
+        with self.edit_lock:
+            revision, tracks = self.revisions.get(kind) or self.fetch_playlist(kind)
+            attempt = 1
+            while True:
+                diff, result = YaClient.playlist_diff(tracks, delete, insert)
+                if not diff.operations:
+                    return revision, tracks
+
+                try:
+                    _pl = self.clt.users_playlists_change(kind, diff.to_json(), revision)
+                except (BadRequestError, NetworkError) as e:
+                    if attempt >= YaClient.EDIT_ATTEMPTS or not YaClient.__wrong_revision(e):
+                        raise
+
+                    print('Playlist revision conflict, rebasing the edit:', kind, e)
+                    attempt += 1
+                    revision, tracks = self.fetch_playlist(kind)
+                    continue
+
+                if _pl is None:
+                    return self.fetch_playlist(kind)
+
+                self.revisions[kind] = res = (_pl.revision, result)
+                self.library.save_tracks(kind, *res)
+                return res
 
     @staticmethod
-    def update_playlist(list_name: str, plist: list[Track], tracks: list[Track | TrackShort]):
+    def __wrong_revision(e: YandexMusicError) -> bool:
+        # The error name of the response is at the message, the other 400 are not retried
+        return 'wrong-revision' in str(e) or '(412)' in str(e)
+
+    @staticmethod
+    def occurrences(tracks: list[Track]) -> list[tuple[str, int]]:
         """
-        Update the playlist tracks and save it to cache file.
-        :param list_name:
-        :param plist:
+        Get the keys of the rows which are kept by the rebase: track id and the number of its copies before the row.
         :param tracks:
         :return:
         """
-        plist.clear()
+        seen: dict[str, int] = {}
+        keys = []
         for _tr in tracks:
-            if isinstance(_tr, TrackShort):
-                _tr = _tr.track
+            _id = str(_tr.id)
+            keys.append((_id, seen.get(_id, 0)))
+            seen[_id] = keys[-1][1] + 1
+
+        return keys
+
+    @staticmethod
+    def playlist_diff(tracks: list[Track], delete: set[tuple[str, int]],
+                      insert: list[Track]) -> tuple[Difference, list[Track]]:
+        """
+        Build the diff of the playlist edit.
+        :param tracks: Current tracks of the playlist.
+        :param delete: `occurrences` keys of the rows to remove.
+        :param insert: Tracks to insert at the top.
+        :return: Diff and the resulting tracks.
+        """
+        diff = Difference()
+        keys = YaClient.occurrences(tracks)
+        # The ranges are deleted from the end, so the indices of the ranges before are not shifted
+        end = len(keys)
+        while end > 0:
+            if keys[end - 1] not in delete:
+                end -= 1
+                continue
+
+            start = end - 1
+            while start > 0 and keys[start - 1] in delete:
+                start -= 1
+
+            diff.add_delete(start, end)
+            end = start
+
+        left = [_tr for _tr, _key in zip(tracks, keys) if _key not in delete]
+        present = {str(_tr.id) for _tr in left}
+        added = []
+        for _tr in insert:
+            if str(_tr.id) not in present and _tr.albums:
+                present.add(str(_tr.id))
+                added.append(_tr)
+
+        if added:
+            diff.add_insert(0, [{'id': _tr.id, 'album_id': _tr.albums[0].id} for _tr in added])
+
+        return diff, added + left
 
-            plist.append(_tr)
+    def load_list(self, list_name: str, kind: int | str=None) -> None:
+        """
+        Load track list for the given playlist and update the playlist.
+        :param list_name:
+        :param kind:
+        :return:
+        """
+        YaClient.update_playlist(self.likes if list_name == 'likes' else self.playlist,
+                                 self.fetch_list(list_name, kind))
 
-        with open(f'{YaClient.CACHE_DIR}/tracks_{list_name.replace(" ", "_")}.json', 'w', encoding='utf-8') as fh:
-            dump([f'{_t.artists_name()} - {_t.title}' for _t in plist], fh)
+    def fetch_similar(self, track_id: int | str) -> list[Track]:
+        """
+        Fetch the similar tracks for given track without updating the client state.
+        :param track_id:
+        :return:
+        """
+        return self.clt.tracks_similar(track_id).similar_tracks
+
+    def load_similar(self, track_id: int | str) -> bool:
+        """
+        Get the similar tracks for given track.
+        :param track_id:
+        :return:
+        """
+        self.similar = self.fetch_similar(track_id)
+        return len(self.similar) != 0
 
     @staticmethod
-    def clear_cache() -> None:
+    def full_tracks(tracks: list[Track | TrackShort]) -> list[Track]:
         """
-        Remove all file from cache directories.
+        Unwrap the short tracks of the playlist.
+        :param tracks:
         :return:
         """
-        for fn in glob(YaClient.TRACKS_DIR):
-            os.remove(fn)
+        return [_tr.track if isinstance(_tr, TrackShort) else _tr for _tr in tracks]
 
-        for fn in glob(YaClient.COVERS_DIR):
-            os.remove(fn)
+    @staticmethod
+    def update_playlist(plist: list[Track], tracks: list[Track | TrackShort]):
+        """
+        Update the playlist tracks.
+        :param plist:
+        :param tracks:
+        :return:
+        """
+        plist.clear()
+        plist.extend(YaClient.full_tracks(tracks))
 
-        for fn in glob(YaClient.CACHE_DIR):
-            os.remove(fn)
+    def clear_cache(self) -> None:
+        """
+        Remove all files from cache directories and the library snapshot.
+        :return:
+        """
+        self.cache.clear()
+        self.library.clear()
@@ -1,21 +1,56 @@
 # -*- coding: utf-8 -*-
 """
 The entryu point of YaPlayer.
+Run with `--profile-startup` to print the timing of the startup phases and exit.
+Run with `--trace` to record the spans of the client calls and the window slots, see `tracing`.
 """
 if __name__ == '__main__':
     import sys
+    from startup import PROFILER, prewarm
+    from tracing import TRACER
+    PROFILER.enabled = '--profile-startup' in sys.argv
+    TRACER.enabled = '--trace' in sys.argv
+    # yandex_music and requests are needed only at login, QtMultimedia only by the window player,
+    # they are loaded while Qt starts
+    prewarm('playback', 'yaclient', 'covers', 'likes', 'stream', 'offline', 'prefetch')
+
     from os import getcwd, path
-    from PyQt5.QtCore import QSize
+    from PyQt5.QtCore import QSize, QTimer
     from PyQt5.QtGui import QIcon
     from PyQt5.QtWidgets import QApplication
     from gui import YaPlayerWindow, _APP_TITLE
+    if TRACER.enabled:
+        from yandex_music import Track
+        from cache import TrackCache
+        from models.tracks import TracksModel
+        from radio import SimilarRadio
+        from transport import PooledRequest
+        from yaclient import YaClient
+        TRACER.instrument(YaClient, 'client')
+        TRACER.instrument(SimilarRadio, 'client', ('start', 'next_batch'))
+        TRACER.instrument(Track, 'client', ('get_download_info',))
+        TRACER.instrument(PooledRequest, 'http', ('_request_wrapper', 'download_file'))
+        TRACER.instrument(TrackCache, 'io')
+        TRACER.instrument(TracksModel, 'model', ('set_tracks', 'insert_rows', 'remove_rows', 'set_liked'))
+        TRACER.instrument(YaPlayerWindow, 'slot')
+    PROFILER.mark('imports')
 
     app = QApplication(sys.argv)
     app.setApplicationName(_APP_TITLE)
     ic = QIcon()
     ic.addFile(path.join(getcwd(), 'ui', 'images', 'logo.png'), QSize(64, 64))
     app.setWindowIcon(ic)
+    PROFILER.mark('application')
     _w = YaPlayerWindow()
     _w.show()
+    PROFILER.mark('show')
     _w.login()
+    if PROFILER.enabled:
+        def _report() -> None:
+            PROFILER.mark('first event loop')
+            print(PROFILER.report())
+            app.quit()
+
+        QTimer.singleShot(0, _report)
+
     sys.exit(app.exec_())